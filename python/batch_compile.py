@@ -0,0 +1,163 @@
+"""
+Compile a directory of macro scripts in parallel.
+
+Each *.py file in the source directory defines a build() function returning a macro
+builder, or a module-level macro:
+
+    from macro import Macro, A
+    def build():
+        return Macro().build((A >> 0.1, 0.1) * 3)
+
+    python batch_compile.py macros/ compiled/ [--format bytecode|recording] [--jobs N] [--force]
+
+The recording format is the timed stream of framed reports: Recording.play() frames each
+report for the serial link. Plain concatenated wire frames are not offered, since they
+would lose the duration of each report.
+
+Outputs are written atomically. A file is skipped if neither it nor the compiler sources
+changed since its last compilation (recorded in the manifest of the output directory).
+"""
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import time
+
+from macro_cache import toolchain_hash, write_atomic
+
+FORMATS = {"bytecode": ".bin", "recording": ".rec"}
+MANIFEST = "manifest.json"
+
+class CompileResult(NamedTuple):
+    name: str
+    output: str | None
+    seconds: float  # Compilation time (0 if skipped)
+    size: int       # Output size in bytes
+    skipped: bool   # Unchanged since the last compilation
+    error: str | None
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"{self.name}: FAILED {self.error}"
+        if self.skipped:
+            return f"{self.name}: unchanged"
+        return f"{self.name}: {self.size} bytes in {self.seconds:0.3f}s"
+
+def _source_hash(path: str, format: str, toolchain: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read() + f"\0{format}\0{toolchain}".encode()).hexdigest()
+
+def _load_builder(path: str):
+    name = "_batch_" + hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if hasattr(module, "build"):
+        return module.build()
+    if hasattr(module, "macro"):
+        return module.macro
+    raise ValueError("defines neither build() nor macro")
+
+def _write_recording(path: str, builder) -> None:
+    from macro import coalesce
+    from recording import Recorder
+    with Recorder(path, clock = lambda: 0.0) as recorder:
+        elapsed_time = 0.0
+        for gamepad, duration in coalesce(builder.run()):
+            recorder.record(gamepad.to_hid_report(), elapsed_time)
+            elapsed_time += duration
+        recorder.close(elapsed_time)
+
+def _compile_file(path: str, output: str, format: str) -> tuple[float, int]:
+    """Worker: build, coalesce and encode one macro script. Returns (seconds, size)."""
+    start = time.perf_counter()
+    builder = _load_builder(path)
+    if format == "bytecode":
+        code = builder.compile()
+        def write(temp_path: str) -> None:
+            with open(temp_path, "wb") as file:
+                file.write(code)
+        write_atomic(output, write)
+    else:
+        write_atomic(output, lambda temp_path: _write_recording(temp_path, builder))
+    return time.perf_counter() - start, os.path.getsize(output)
+
+def compile_library(
+    source_dir: str,
+    output_dir: str,
+    format: str = "bytecode",
+    jobs: int | None = None,
+    force: bool = False,
+) -> list[CompileResult]:
+    """Compile every macro script in source_dir into output_dir, one worker process per core by default."""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format: {format}")
+    os.makedirs(output_dir, exist_ok = True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    try:
+        with open(manifest_path) as file:
+            manifest: dict[str, dict] = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    toolchain = toolchain_hash()
+    results: dict[str, CompileResult] = {}
+    pending: dict[str, tuple[str, str, str]] = {} # name -> (path, output, hash)
+    for entry in sorted(os.scandir(source_dir), key = lambda entry: entry.name):
+        if not entry.is_file() or not entry.name.endswith(".py"):
+            continue
+        name = entry.name[:-3]
+        output = os.path.join(output_dir, name + FORMATS[format])
+        source_hash = _source_hash(entry.path, format, toolchain)
+        if not force and manifest.get(name, {}).get("hash") == source_hash and os.path.exists(output):
+            results[name] = CompileResult(name, output, 0.0, os.path.getsize(output), True, None)
+        else:
+            pending[name] = (entry.path, output, source_hash)
+
+    if pending:
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = {
+                name: executor.submit(_compile_file, path, output, format)
+                for name, (path, output, _) in pending.items()
+            }
+            for name, future in futures.items():
+                _, output, source_hash = pending[name]
+                try:
+                    seconds, size = future.result()
+                except Exception as e:
+                    results[name] = CompileResult(name, None, 0.0, 0, False, f"{type(e).__name__}: {e}")
+                    manifest.pop(name, None)
+                else:
+                    results[name] = CompileResult(name, output, seconds, size, False, None)
+                    manifest[name] = {"hash": source_hash, "seconds": seconds, "size": size}
+
+    write_atomic(manifest_path, lambda temp_path: _dump_json(temp_path, manifest))
+    return [results[name] for name in sorted(results)]
+
+def _dump_json(path: str, data: object) -> None:
+    with open(path, "w") as file:
+        json.dump(data, file, indent = 2)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--format", choices = sorted(FORMATS), default = "bytecode")
+    parser.add_argument("--jobs", type = int, help = "worker processes (default: number of cores)")
+    parser.add_argument("--force", action = "store_true", help = "recompile unchanged files too")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = compile_library(args.source_dir, args.output_dir, args.format, args.jobs, args.force)
+    for result in results:
+        print(result)
+    failed = sum(result.error is not None for result in results)
+    print(f"{len(results)} files, {failed} failed in {time.perf_counter() - start:0.3f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Benchmarks of the macro DSL, model and codec hot paths. No hardware is needed.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json --threshold 0.2
+
+With a baseline, the exit status is 1 if any case is slower than the baseline by more than the threshold.
+"""
+from typing import NamedTuple
+from collections.abc import Callable
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from model import Gamepad, Button, HatSwitch, Vec2
+from codec import cobsr, crc8, varint, frame
+from macro import Macro, A, B, X, UP, LS, RS
+
+class Case(NamedTuple):
+    name: str
+    ops: int # Operations per call, to report the time per operation
+    setup: Callable[[], Callable[[], object]] # Returns the function to time
+
+class Result(NamedTuple):
+    seconds: float # Best time of one call
+    ops: int
+
+    @property
+    def per_op(self) -> float:
+        return self.seconds / self.ops
+
+def _sequence(events: int, seed: int = 0) -> list[object]:
+    """An input sequence of about the given number of events (each press is a begin and an end)."""
+    rng = random.Random(seed)
+    handles = [A, B, X, UP, LS(Vec2.UP), RS(Vec2.LEFT), A + B, LS(Vec2(0.5, -0.5))]
+    return [(rng.choice(handles) >> rng.choice((0.05, 0.1, 0.016)), rng.choice((0, 0.05))) for _ in range(events // 2)]
+
+def _drain(segments) -> None:
+    for _ in segments:
+        pass
+
+def _build(events: int) -> Callable[[], object]:
+    sequence = _sequence(events)
+    return lambda: Macro().build(sequence)
+
+def _add(events: int) -> Callable[[], object]:
+    # Concatenated and overlaid chunks, then run, which is where the composition is merged
+    chunks = [Macro().build(_sequence(100, seed)) for seed in range(max(events // 100, 1))]
+    overlay = _sequence(events // 10, 1)
+    def run() -> None:
+        m = Macro()
+        for chunk in chunks:
+            m = m + chunk
+        _drain(m.build(overlay).run())
+    return run
+
+def _run(events: int) -> Callable[[], object]:
+    m = Macro().build(_sequence(events))
+    return lambda: _drain(m.run())
+
+def _gamepads(n: int) -> list[Gamepad]:
+    rng = random.Random(0)
+    return [
+        Gamepad(
+            Button(rng.randrange(0x4000)),
+            HatSwitch(rng.randrange(16)),
+            Vec2.UP.rotate(rng.randrange(360)) * rng.random(),
+            Vec2(rng.uniform(-1.2, 1.2), rng.uniform(-1.2, 1.2)),
+        )
+        for _ in range(n)
+    ]
+
+def _to_hid_report(n: int) -> Callable[[], object]:
+    gamepads = _gamepads(n)
+    return lambda: [gamepad.to_hid_report() for gamepad in gamepads]
+
+def _from_hid_report(n: int) -> Callable[[], object]:
+    reports = [gamepad.to_hid_report() for gamepad in _gamepads(n)]
+    return lambda: [Gamepad.from_hid_report(report) for report in reports]
+
+def _rotate(n: int) -> Callable[[], object]:
+    v = Vec2(0.3, -0.7)
+    return lambda: [v.rotate(degrees) for degrees in range(n)]
+
+def _clamp_magnitude(n: int) -> Callable[[], object]:
+    rng = random.Random(0)
+    vectors = [Vec2(rng.uniform(-1.5, 1.5), rng.uniform(-1.5, 1.5)) for _ in range(n)]
+    return lambda: [v.clamp_magnitude() for v in vectors]
+
+def _reports(n: int) -> list[bytes]:
+    return [gamepad.to_hid_report() for gamepad in _gamepads(n)]
+
+def _cobsr_encode(n: int) -> Callable[[], object]:
+    reports = _reports(n)
+    return lambda: [cobsr.encode(report) for report in reports]
+
+def _cobsr_decode(n: int) -> Callable[[], object]:
+    encoded = [cobsr.encode(report) for report in _reports(n)]
+    return lambda: [cobsr.decode(data) for data in encoded]
+
+def _cobsr_encode_large(size: int) -> Callable[[], object]:
+    rng = random.Random(0)
+    data = bytes(rng.choice((0, rng.randrange(256))) for _ in range(size))
+    return lambda: cobsr.encode(data)
+
+def _crc8(n: int) -> Callable[[], object]:
+    reports = _reports(n)
+    return lambda: [crc8.ccitt(report) for report in reports]
+
+def _frame_encode(n: int) -> Callable[[], object]:
+    reports = _reports(n)
+    return lambda: [frame.encode(report) for report in reports]
+
+def _varint(n: int) -> Callable[[], object]:
+    rng = random.Random(0)
+    values = [rng.choice((rng.randrange(0x80), rng.randrange(0x4000), rng.randrange(1 << 32))) for _ in range(n)]
+    return lambda: [varint.decode(varint.encode(value)) for value in values]
+
+def _varint_values(n: int) -> list[int]:
+    # Mostly short delta times, as in the compact bytecode and recordings
+    rng = random.Random(0)
+    return [rng.choice((rng.randrange(0x80), rng.randrange(0x80), rng.randrange(0x4000), rng.randrange(1 << 32))) for _ in range(n)]
+
+def _varint_iter_decode(n: int) -> Callable[[], object]:
+    data = varint.encode_many(_varint_values(n))
+    return lambda: list(varint.iter_decode(data))
+
+def _varint_encode_into(n: int) -> Callable[[], object]:
+    values = _varint_values(n)
+    out = bytearray(sum(map(varint.encoded_size, values)))
+    return lambda: varint.encode_into(values, out)
+
+def cases(full: bool = False) -> list[Case]:
+    sizes = (1_000, 10_000, 100_000, 1_000_000) if full else (1_000, 10_000, 100_000)
+    return [
+        *(Case(f"macro.build[{n}]", n, lambda n=n: _build(n)) for n in sizes),
+        *(Case(f"macro.add[{n}]", n, lambda n=n: _add(n)) for n in sizes),
+        *(Case(f"macro.run[{n}]", n, lambda n=n: _run(n)) for n in sizes),
+        Case("gamepad.to_hid_report", 10_000, lambda: _to_hid_report(10_000)),
+        Case("gamepad.from_hid_report", 10_000, lambda: _from_hid_report(10_000)),
+        Case("vec2.rotate", 10_000, lambda: _rotate(10_000)),
+        Case("vec2.clamp_magnitude", 10_000, lambda: _clamp_magnitude(10_000)),
+        Case("cobsr.encode", 10_000, lambda: _cobsr_encode(10_000)),
+        Case("cobsr.decode", 10_000, lambda: _cobsr_decode(10_000)),
+        Case("cobsr.encode[64k]", 1, lambda: _cobsr_encode_large(65_536)),
+        Case("crc8.ccitt", 10_000, lambda: _crc8(10_000)),
+        Case("frame.encode", 10_000, lambda: _frame_encode(10_000)),
+        Case("varint.roundtrip", 10_000, lambda: _varint(10_000)),
+        Case("varint.iter_decode", 10_000, lambda: _varint_iter_decode(10_000)),
+        Case("varint.encode_into", 10_000, lambda: _varint_encode_into(10_000)),
+    ]
+
+def measure(case: Case, repeat: int) -> Result:
+    function = case.setup()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return Result(best, case.ops)
+
+def compare(results: dict[str, Result], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Return the names of the cases that are slower than the baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result.seconds / baseline[name]["seconds"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{name:32} {ratio:6.2f}x {status}")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help = "write the results as JSON to this file")
+    parser.add_argument("--baseline", help = "compare with the results in this JSON file")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "allowed slowdown (default: 0.2 = 20%%)")
+    parser.add_argument("--repeat", type = int, default = 5, help = "runs per case, the best is kept (default: 5)")
+    parser.add_argument("--filter", default = "", help = "only run the cases whose name contains this")
+    parser.add_argument("--full", action = "store_true", help = "include the 1M event macro cases")
+    args = parser.parse_args(argv)
+
+    results: dict[str, Result] = {}
+    for case in cases(args.full):
+        if args.filter not in case.name:
+            continue
+        result = measure(case, args.repeat)
+        results[case.name] = result
+        print(f"{case.name:32} {result.seconds * 1000:10.3f} ms {result.per_op * 1e9:10.1f} ns/op")
+
+    document = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "results": {name: {"seconds": r.seconds, "ops": r.ops, "per_op": r.per_op} for name, r in results.items()},
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(document, file, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+from .compiler import CompileStats, compile, compile_with_stats, encode_frame, encode_frames, encode_loop, fold_loops
+from .interpreter import BytecodeError, interpret, validate
+
+__all__ = [
+    "CompileStats", "compile", "compile_with_stats", "encode_frame", "encode_frames", "encode_loop", "fold_loops",
+    "BytecodeError", "interpret", "validate",
+]
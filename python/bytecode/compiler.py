@@ -0,0 +1,142 @@
+from typing import NamedTuple
+from collections.abc import Iterable
+import bisect
+import itertools
+
+from model import Gamepad
+from codec import varint
+from .opcode import LOOP_BEGIN, LOOP_END, DIFF, TIME_UNIT, NEUTRAL_REPORT, RESERVED_REPORTS
+
+class CompileStats(NamedTuple):
+    frames: int
+    unfolded_size: int
+    size: int
+
+    @property
+    def ratio(self) -> float:
+        """Compression ratio achieved by loop folding (unfolded size / folded size)."""
+        return self.unfolded_size / self.size if self.size else 1.0
+
+_reserved_report_to_code = {report: code for code, report in RESERVED_REPORTS.items()}
+
+def encode_frame(report: bytes, delta_time: int) -> bytes:
+    """
+    Encode a single HID report followed by its delta time (in TIME_UNIT).
+    A reserved report code is used if available, otherwise a diff from the neutral report.
+    """
+    code = _reserved_report_to_code.get(report)
+    if code is not None:
+        return bytes((code,)) + varint.encode(delta_time)
+
+    if len(report) != len(NEUTRAL_REPORT) or report[-1] != NEUTRAL_REPORT[-1]:
+        raise ValueError(f"Unsupported report: {report.hex(' ')}")
+
+    code = DIFF
+    delta = bytearray()
+    for bit, (byte, neutral) in enumerate(zip(report[:-1], NEUTRAL_REPORT)):
+        if byte != neutral:
+            code |= 1 << bit
+            delta.append(byte)
+    return bytes((code, *delta)) + varint.encode(delta_time)
+
+def encode_loop(body: Iterable[bytes], count: int) -> bytes:
+    """Wrap already encoded codes in Loop Begin/Loop End."""
+    return bytes((LOOP_BEGIN,)) + varint.encode(count) + b"".join(body) + bytes((LOOP_END,))
+
+def encode_frames(segments: Iterable[tuple[Gamepad, float]]) -> list[bytes]:
+    """
+    Encode (gamepad, duration) segments into a list of frame codes.
+    Durations are quantized against the accumulated time so that rounding errors do not pile up.
+    Segments that are shorter than TIME_UNIT after quantization are dropped.
+    """
+    frames: list[bytes] = []
+    elapsed_time = 0
+    emitted_ticks = 0
+    for gamepad, duration in segments:
+        elapsed_time += duration
+        ticks = round(elapsed_time / TIME_UNIT)
+        if ticks > emitted_ticks:
+            frames.append(encode_frame(gamepad.to_hid_report(), ticks - emitted_ticks))
+            emitted_ticks = ticks
+    return frames
+
+def fold_loops(codes: list[bytes], max_period: int = 256) -> list[bytes]:
+    """
+    Replace consecutive repetitions of code sequences with loops.
+    Repetitions inside a loop body and repetitions of loops are folded as well,
+    so the result grows with the number of distinct patterns rather than the length.
+    """
+    while True:
+        folded = _fold_loops_once(codes, max_period)
+        if len(folded) == len(codes):
+            return folded
+        codes = folded
+
+def _fold_loops_once(codes: list[bytes], max_period: int) -> list[bytes]:
+    ids: dict[bytes, int] = {}
+    seq = [ids.setdefault(code, len(ids)) for code in codes]
+    positions: dict[int, list[int]] = {}
+    for i, id in enumerate(seq):
+        positions.setdefault(id, []).append(i)
+    offsets = [0, *itertools.accumulate(map(len, codes))]
+    n = len(seq)
+
+    result: list[bytes] = []
+    i = 0
+    while i < n:
+        # Candidate periods are the distances to the next occurrences of the same code
+        occurrences = positions[seq[i]]
+        start = bisect.bisect_right(occurrences, i)
+        stop = bisect.bisect_right(occurrences, i + max_period, lo = start)
+        best_saving = 0
+        best_period = best_count = 0
+        # (period, run) of shorter periods whose run is still long enough to cover a period
+        covering: list[tuple[int, int]] = []
+        for j in occurrences[start:stop]:
+            period = j - i
+            if covering:
+                # Periods only increase, so runs shorter than this one never cover again
+                covering = [(p, r) for p, r in covering if r >= period]
+                if any(period % p == 0 for p, _ in covering):
+                    # The body itself repeats with a shorter period which covers this run
+                    continue
+            run = 0
+            while j + run < n and seq[i + run] == seq[j + run]:
+                run += 1
+            if run > period:
+                covering.append((period, run))
+            count = 1 + run // period
+            if count < 2:
+                continue
+            body_size = offsets[i + period] - offsets[i]
+            saving = (count - 1) * body_size - len(varint.encode(count)) - 2
+            if saving > best_saving:
+                best_saving, best_period, best_count = saving, period, count
+
+        if best_saving > 0:
+            body = fold_loops(codes[i:i + best_period], max_period)
+            result.append(encode_loop(body, best_count))
+            i += best_period * best_count
+        else:
+            result.append(codes[i])
+            i += 1
+    return result
+
+def compile_with_stats(
+    segments: Iterable[tuple[Gamepad, float]],
+    loop_folding: bool = True,
+    max_period: int = 256,
+) -> tuple[bytes, CompileStats]:
+    """Compile segments into the compact macro format and report the compression achieved."""
+    frames = encode_frames(segments)
+    unfolded_size = sum(map(len, frames))
+    code = b"".join(fold_loops(frames, max_period) if loop_folding else frames)
+    return code, CompileStats(len(frames), unfolded_size, len(code))
+
+def compile(
+    segments: Iterable[tuple[Gamepad, float]],
+    loop_folding: bool = True,
+    max_period: int = 256,
+) -> bytes:
+    """Compile (gamepad, duration) segments into the compact format described in macro_specification.md."""
+    return compile_with_stats(segments, loop_folding, max_period)[0]
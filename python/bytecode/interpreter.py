@@ -0,0 +1,150 @@
+from collections.abc import Generator
+import mmap
+
+from codec import varint
+from frame_cache import FrameCache
+from .opcode import LOOP_BEGIN, LOOP_END, DIFF, TIME_UNIT, NEUTRAL_REPORT, RESERVED_REPORTS
+
+_RESERVED_FIRST = min(RESERVED_REPORTS)
+_RESERVED_LAST = max(RESERVED_REPORTS)
+_DIFF_BYTES = len(NEUTRAL_REPORT) - 1 # The last byte is not covered by the code bits
+
+Code = bytes | bytearray | memoryview | mmap.mmap
+
+class BytecodeError(ValueError):
+    """Malformed compact bytecode. offset is the position of the offending byte."""
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(f"{message} at offset {offset}")
+        self.offset = offset
+
+def _read_varint(data: memoryview, offset: int) -> tuple[int, int]:
+    """Decode a varint at offset and return (value, next offset)."""
+    try:
+        return varint.decode_from(data, offset)
+    except varint.VarintError as e:
+        raise BytecodeError("Truncated varint", e.offset) from None
+
+def _skip_report(data: memoryview, code: int, offset: int) -> int:
+    """Return the offset of the delta time after the report code at offset - 1."""
+    if _RESERVED_FIRST <= code <= _RESERVED_LAST:
+        return offset
+    if code & DIFF:
+        end = offset + (code & ~DIFF).bit_count()
+        if end > len(data):
+            raise BytecodeError("Truncated diff report", offset - 1)
+        return end
+    raise BytecodeError(f"Unknown code 0x{code:02x}", offset - 1)
+
+def validate(code: Code) -> int:
+    """
+    Check the whole byte stream without running loops and return the number of
+    report codes in it. Raises BytecodeError for malformed input.
+    """
+    data = memoryview(code)
+    loops: list[int] = []
+    reports = 0
+    offset = 0
+    try:
+        while offset < len(data):
+            op = data[offset]
+            offset += 1
+            if op == LOOP_BEGIN:
+                loops.append(offset - 1)
+                _, offset = _read_varint(data, offset)
+            elif op == LOOP_END:
+                if not loops:
+                    raise BytecodeError("Loop End without Loop Begin", offset - 1)
+                loops.pop()
+            else:
+                offset = _skip_report(data, op, offset)
+                _, offset = _read_varint(data, offset)
+                reports += 1
+        if loops:
+            raise BytecodeError("Loop Begin without Loop End", loops[-1])
+        return reports
+    finally:
+        data.release()
+
+def _find_loop_end(data: memoryview, offset: int) -> int:
+    """Return the offset just after the Loop End matching a loop body starting at offset."""
+    depth = 0
+    while offset < len(data):
+        op = data[offset]
+        offset += 1
+        if op == LOOP_BEGIN:
+            _, offset = _read_varint(data, offset)
+            depth += 1
+        elif op == LOOP_END:
+            if not depth:
+                return offset
+            depth -= 1
+        else:
+            _, offset = _read_varint(data, _skip_report(data, op, offset))
+    raise BytecodeError("Loop Begin without Loop End", offset)
+
+def interpret(code: Code, framed: bool = False) -> Generator[tuple[bytes, float], None, None]:
+    """
+    Execute compact bytecode (see macro_specification.md) and yield (report, duration)
+    for each report code, reading the code in place (e.g. from an mmap) and running loops
+    without expanding them.
+
+    With framed=True, the wire frames (COBS/R + CRC + delimiter) are yielded instead of
+    the reports, which can be played with Player(write, encode=bytes).
+    Errors are raised with the offset when the malformed part is reached; use validate()
+    to check the whole input beforehand.
+    """
+    data = memoryview(code)
+    size = len(data)
+    cache = FrameCache() if framed else None
+    report = bytearray(NEUTRAL_REPORT)
+    loops: list[list[int]] = [] # [body offset, remaining count, begin offset]
+    offset = 0
+    try:
+        while offset < size:
+            op = data[offset]
+            offset += 1
+            if op >= DIFF:
+                report[:] = NEUTRAL_REPORT
+                if offset + (op & ~DIFF).bit_count() > size:
+                    raise BytecodeError("Truncated diff report", offset - 1)
+                for index in range(_DIFF_BYTES):
+                    if op >> index & 1:
+                        report[index] = data[offset]
+                        offset += 1
+            elif _RESERVED_FIRST <= op <= _RESERVED_LAST:
+                report[:] = RESERVED_REPORTS[op]
+            elif op == LOOP_BEGIN:
+                begin = offset - 1
+                count, offset = _read_varint(data, offset)
+                if count and data[offset:offset + 1] != bytes((LOOP_END,)):
+                    loops.append([offset, count, begin])
+                else:
+                    # Nothing to repeat (including empty bodies)
+                    offset = _find_loop_end(data, offset)
+                continue
+            elif op == LOOP_END:
+                if not loops:
+                    raise BytecodeError("Loop End without Loop Begin", offset - 1)
+                loop = loops[-1]
+                loop[1] -= 1
+                if loop[1]:
+                    offset = loop[0]
+                else:
+                    loops.pop()
+                continue
+            else:
+                raise BytecodeError(f"Unknown code 0x{op:02x}", offset - 1)
+
+            # Delta time, with the common single byte case inline
+            if offset < size and data[offset] < 0x80:
+                delta = data[offset]
+                offset += 1
+            else:
+                delta, offset = _read_varint(data, offset)
+            current = bytes(report)
+            yield (current if cache is None else cache.encode_report(current)), delta * TIME_UNIT
+        if loops:
+            raise BytecodeError("Loop Begin without Loop End", loops[-1][2])
+    finally:
+        data.release()
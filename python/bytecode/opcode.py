@@ -0,0 +1,52 @@
+# See macro_specification.md
+
+LOOP_BEGIN = 0x01
+LOOP_END = 0x02
+DIFF = 0x80
+
+# Unit of the varint delta time (seconds)
+TIME_UNIT = 0.001
+
+NEUTRAL_REPORT = b"\x00\x00\x0F\x80\x80\x80\x80\x00"
+
+RESERVED_REPORTS = {
+    0x10: b"\x00\x00\x0F\x80\x80\x80\x80\x00", # Neutral
+    0x11: b"\x01\x00\x0F\x80\x80\x80\x80\x00", # Y
+    0x12: b"\x02\x00\x0F\x80\x80\x80\x80\x00", # B
+    0x13: b"\x04\x00\x0F\x80\x80\x80\x80\x00", # A
+    0x14: b"\x08\x00\x0F\x80\x80\x80\x80\x00", # X
+    0x15: b"\x10\x00\x0F\x80\x80\x80\x80\x00", # L
+    0x16: b"\x20\x00\x0F\x80\x80\x80\x80\x00", # R
+    0x17: b"\x40\x00\x0F\x80\x80\x80\x80\x00", # ZL
+    0x18: b"\x80\x00\x0F\x80\x80\x80\x80\x00", # ZR
+    0x19: b"\x00\x01\x0F\x80\x80\x80\x80\x00", # Minus
+    0x1a: b"\x00\x02\x0F\x80\x80\x80\x80\x00", # Plus
+    0x1b: b"\x00\x04\x0F\x80\x80\x80\x80\x00", # LS
+    0x1c: b"\x00\x08\x0F\x80\x80\x80\x80\x00", # RS
+    0x1d: b"\x00\x10\x0F\x80\x80\x80\x80\x00", # HOME
+    0x1e: b"\x00\x20\x0F\x80\x80\x80\x80\x00", # Capture
+    0x1f: b"\x00\x00\x00\x80\x80\x80\x80\x00", # Hat Up
+    0x20: b"\x00\x00\x01\x80\x80\x80\x80\x00", # Hat Up-Right
+    0x21: b"\x00\x00\x02\x80\x80\x80\x80\x00", # Hat Right
+    0x22: b"\x00\x00\x03\x80\x80\x80\x80\x00", # Hat Down-Right
+    0x23: b"\x00\x00\x04\x80\x80\x80\x80\x00", # Hat Down
+    0x24: b"\x00\x00\x05\x80\x80\x80\x80\x00", # Hat Down-Left
+    0x25: b"\x00\x00\x06\x80\x80\x80\x80\x00", # Hat Left
+    0x26: b"\x00\x00\x07\x80\x80\x80\x80\x00", # Hat Up-Left
+    0x27: b"\x00\x00\x0F\x80\x00\x80\x80\x00", # LS Up
+    0x28: b"\x00\x00\x0F\xDA\x25\x80\x80\x00", # LS Up-Right
+    0x29: b"\x00\x00\x0F\xFF\x80\x80\x80\x00", # LS Right
+    0x2a: b"\x00\x00\x0F\xDA\xDA\x80\x80\x00", # LS Down-Right
+    0x2b: b"\x00\x00\x0F\x80\xFF\x80\x80\x00", # LS Down
+    0x2c: b"\x00\x00\x0F\x25\xDA\x80\x80\x00", # LS Down-Left
+    0x2d: b"\x00\x00\x0F\x00\x80\x80\x80\x00", # LS Left
+    0x2e: b"\x00\x00\x0F\x25\x25\x80\x80\x00", # LS Up-Left
+    0x2f: b"\x00\x00\x0F\x80\x80\x80\x00\x00", # RS Up
+    0x30: b"\x00\x00\x0F\x80\x80\xDA\x25\x00", # RS Up-Right
+    0x31: b"\x00\x00\x0F\x80\x80\xFF\x80\x00", # RS Right
+    0x32: b"\x00\x00\x0F\x80\x80\xDA\xDA\x00", # RS Down-Right
+    0x33: b"\x00\x00\x0F\x80\x80\x80\xFF\x00", # RS Down
+    0x34: b"\x00\x00\x0F\x80\x80\x25\xDA\x00", # RS Down-Left
+    0x35: b"\x00\x00\x0F\x80\x80\x00\x80\x00", # RS Left
+    0x36: b"\x00\x00\x0F\x80\x80\x25\x25\x00", # RS Up-Left
+}
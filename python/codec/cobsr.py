@@ -9,42 +9,41 @@ def encode(data: bytes) -> bytes:
     if not data:
         return b"\x01"
 
-    # Allocate buffer: every 254 bytes may require an extra code byte
-    buf = bytearray(len(data) + len(data) // 254 + 1)
+    buf = bytearray()
 
-    write_index = 1
-    code_index = 0
-    code = 1 # Distance to the next zero or block boundary
+    # Copy the runs between zero bytes at once instead of byte by byte
+    *blocks, final = data.split(b"\x00")
+    for block in blocks:
+        pos = _encode_full_blocks(block, buf)
+        # Close the block at the zero byte
+        buf.append(len(block) - pos + 1)
+        buf += block[pos:]
 
-    for byte in data:
-        if byte != 0:
-            buf[write_index] = byte
-            write_index += 1
-            code += 1
-            if code == 0xFF:
-                # Finalize the current code (i.e. close the block) and start a new block
-                buf[code_index] = code
-                code_index = write_index
-                write_index += 1
-                code = 1
-        else:
-            # Finalize the current code (i.e. close the block) and start a new block
-            buf[code_index] = code
-            code_index = write_index
-            write_index += 1
-            code = 1
+    pos = _encode_full_blocks(final, buf)
+    code = len(final) - pos + 1 # Distance to the end of data
 
     # --- COBS/R optimization ---
     # If the last data byte is greater than or equal to the final code value,
     # it can replace the code byte directly, and the redundant last byte
     # can be removed from the sequence.
     if data[-1] >= code:
-        buf[code_index] = data[-1]
-        write_index -= 1
+        if pos != len(final):
+            buf.append(data[-1])
+            buf += final[pos:-1]
     else:
-        buf[code_index] = code
+        buf.append(code)
+        buf += final[pos:]
 
-    return bytes(buf[:write_index])
+    return bytes(buf)
+
+def _encode_full_blocks(block: bytes, buf: bytearray) -> int:
+    """Write 254-byte blocks (code 0xFF) of a zero-free run and return the number of bytes written."""
+    pos = 0
+    while len(block) - pos >= 0xFE:
+        buf.append(0xFF)
+        buf += block[pos:pos + 0xFE]
+        pos += 0xFE
+    return pos
 
 def decode(data: bytes) -> bytes:
     """
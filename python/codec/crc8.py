@@ -1,5 +1,12 @@
 # https://www.3dbrew.org/wiki/CRC-8-CCITT
 
+from collections.abc import Sequence
+
+try:
+    import numpy as np # Optional: pip install numpy
+except ImportError:
+    np = None
+
 _crc8_ccitt_table = (
     b"\x00\x07\x0E\x09\x1C\x1B\x12\x15\x38\x3F\x36\x31\x24\x23\x2A\x2D"
     b"\x70\x77\x7E\x79\x6C\x6B\x62\x65\x48\x4F\x46\x41\x54\x53\x5A\x5D"
@@ -25,3 +32,18 @@ def ccitt(data: bytes) -> int:
     for byte in data:
         crc = _crc8_ccitt_table[crc ^ byte]
     return crc
+
+def ccitt_many(data_list: Sequence[bytes]) -> list[int]:
+    """
+    Calculate CRC-8-CCITT checksums for many byte sequences at once.
+    If NumPy is available and all sequences have the same length, the table lookups
+    are vectorized over the sequences (one step per byte position).
+    """
+    if np is not None and len(data_list) >= 64 and len(set(map(len, data_list))) == 1:
+        columns = np.frombuffer(b"".join(data_list), dtype = np.uint8).reshape(len(data_list), -1).T
+        table = np.frombuffer(_crc8_ccitt_table, dtype = np.uint8)
+        crc = np.zeros(len(data_list), dtype = np.uint8)
+        for column in columns:
+            crc = table[crc ^ column]
+        return crc.tolist()
+    return [ccitt(data) for data in data_list]
@@ -0,0 +1,82 @@
+from collections.abc import Iterable, Sequence
+
+from . import cobsr, crc8
+
+_MAX_DECODED_PACKETS = 65536
+
+def encode(report: bytes) -> bytes:
+    """
+    Frame a report for the serial link: append CRC-8-CCITT, encode with COBS/R
+    and terminate with a zero byte (see leonardo_for_nintendo_switch.ino).
+    """
+    return cobsr.encode(report + bytes((crc8.ccitt(report),))) + b"\x00"
+
+def decode(packet: bytes) -> bytes:
+    """
+    Decode a packet without the zero delimiter and return the report.
+    Raises ValueError if the packet is malformed or the CRC does not match.
+    """
+    data = cobsr.decode(packet)
+    if not data or crc8.ccitt(data):
+        raise ValueError("CRC mismatch")
+    return data[:-1]
+
+def max_frame_size(report_size: int) -> int:
+    """Return the maximum number of bytes encode() produces for a report of the given size."""
+    return report_size + 1 + (report_size + 1) // 254 + 1 + 1
+
+def encode_into(reports: Iterable[bytes], out: bytearray | memoryview, offset: int = 0) -> int:
+    """
+    Frame many reports into a preallocated buffer starting at offset and return the end offset.
+    Each distinct report is encoded only once and the checksums are calculated in a batch.
+    Raises ValueError if the buffer is too small.
+    """
+    reports = reports if isinstance(reports, Sequence) else list(reports)
+    distinct = list(dict.fromkeys(reports))
+    frames = {
+        report: cobsr.encode(report + bytes((crc,))) + b"\x00"
+        for report, crc in zip(distinct, crc8.ccitt_many(distinct))
+    }
+    for report in reports:
+        data = frames[report]
+        end = offset + len(data)
+        if end > len(out):
+            raise ValueError("Output buffer is too small")
+        out[offset:end] = data
+        offset = end
+    return offset
+
+def encode_many(reports: Iterable[bytes]) -> bytes:
+    """Frame many reports into one contiguous byte sequence, e.g. a whole macro or recording."""
+    reports = reports if isinstance(reports, Sequence) else list(reports)
+    out = bytearray(sum(max_frame_size(len(report)) for report in reports))
+    end = encode_into(reports, out)
+    del out[end:]
+    return bytes(out)
+
+def decode_stream(data: bytes | bytearray) -> list[bytes]:
+    """
+    Decode a concatenated stream of frames and return the valid reports.
+    Like the firmware, empty, malformed and CRC mismatched packets are skipped.
+    An incomplete packet at the end (without the delimiter) is ignored.
+    """
+    reports: list[bytes] = []
+    decoded: dict[bytes, bytes | None] = {} # Packets repeat a lot, so decode each only once
+    start = 0
+    while (end := data.find(b"\x00", start)) != -1:
+        packet = bytes(data[start:end])
+        start = end + 1
+        if not packet:
+            continue
+        if packet in decoded:
+            report = decoded[packet]
+        else:
+            try:
+                report = decode(packet)
+            except ValueError:
+                report = None
+            if len(decoded) < _MAX_DECODED_PACKETS:
+                decoded[packet] = report
+        if report is not None:
+            reports.append(report)
+    return reports
@@ -1,9 +1,27 @@
 # https://protobuf.dev/programming-guides/encoding/
 
+from collections.abc import Iterable, Iterator
+import mmap
+
+Buffer = bytes | bytearray | memoryview | mmap.mmap
+
+class VarintError(ValueError):
+    """Truncated Varint. offset is the position of its first byte."""
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(f"{message} at offset {offset}")
+        self.offset = offset
+
+def encoded_size(value: int) -> int:
+    """Return the number of bytes encode() produces for a non-negative integer."""
+    return max(1, (value.bit_length() + 6) // 7)
+
 def encode(value: int) -> bytearray:
     """Encode a non-negative integer into Varint format."""
     if value < 0:
         raise ValueError("Negative integer is not supported.")
+    if value < 0x80:
+        return bytearray((value,))
 
     result = bytearray()
     while value >= 0x80:
@@ -12,17 +30,91 @@ def encode(value: int) -> bytearray:
     result.append(value)
     return result
 
-def decode(data: bytes) -> int:
+def encode_into(values: Iterable[int], out: bytearray | memoryview, offset: int = 0) -> int:
+    """
+    Encode many non-negative integers into a preallocated buffer starting at offset
+    and return the end offset. Raises ValueError if the buffer is too small.
+    """
+    try:
+        for value in values:
+            if 0 <= value < 0x80:
+                out[offset] = value
+                offset += 1
+                continue
+            if value < 0:
+                raise ValueError("Negative integer is not supported.")
+            while value >= 0x80:
+                out[offset] = (value & 0x7f) | 0x80
+                offset += 1
+                value >>= 7
+            out[offset] = value
+            offset += 1
+    except IndexError:
+        raise ValueError("Output buffer is too small") from None
+    return offset
+
+def encode_many(values: Iterable[int]) -> bytes:
+    """Encode many integers into one contiguous byte sequence."""
+    values = values if isinstance(values, (list, tuple)) else list(values)
+    out = bytearray(sum(encoded_size(value) for value in values if value >= 0))
+    encode_into(values, out)
+    return bytes(out)
+
+def decode(data: Buffer) -> int:
     """Decode a Varint from the given byte sequence and return only the value."""
-    return decode_with_length(data)[0]
+    return decode_from(data)[0]
 
-def decode_with_length(data: bytes) -> tuple[int, int]:
+def decode_with_length(data: Buffer) -> tuple[int, int]:
     """Decode a Varint from the given byte sequence and return (value, consumed_bytes)."""
-    offset = 0
-    result = 0
-    for consumed, byte in enumerate(data, start=1):
-        result |= (byte & 0x7F) << offset
-        if not (byte & 0x80):
-            return result, consumed
-        offset += 7
-    raise ValueError("Invalid varint encoding: missing termination")
\ No newline at end of file
+    return decode_from(data)
+
+def decode_from(data: Buffer, offset: int = 0) -> tuple[int, int]:
+    """
+    Decode a Varint at offset in a buffer without copying it and return (value, next offset).
+    Raises VarintError if the buffer ends before the last byte of the Varint.
+    """
+    if offset < 0:
+        raise ValueError("Negative offset is not supported.")
+    # Fast paths for 1 and 2 byte values (up to 16383)
+    try:
+        byte = data[offset]
+        if byte < 0x80:
+            return byte, offset + 1
+        second = data[offset + 1]
+        if second < 0x80:
+            return (byte & 0x7f) | second << 7, offset + 2
+    except IndexError:
+        raise VarintError("Truncated varint", offset) from None
+
+    start = offset
+    value = (byte & 0x7f) | (second & 0x7f) << 7
+    shift = 14
+    offset += 2
+    size = len(data)
+    while offset < size:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+    raise VarintError("Truncated varint", start)
+
+def iter_decode(data: Buffer, offset: int = 0, end: int | None = None) -> Iterator[int]:
+    """
+    Yield every Varint of a buffer from offset to end (default: the end of the buffer).
+    Raises VarintError if the last Varint is truncated.
+    """
+    view = memoryview(data)[:end]
+    size = len(view)
+    try:
+        while offset < size:
+            byte = view[offset]
+            if byte < 0x80:
+                offset += 1
+                yield byte
+            else:
+                value, offset = decode_from(view, offset)
+                yield value
+    finally:
+        view.release()
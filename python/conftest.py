@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules import each other as top-level modules (e.g. from model import Gamepad)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts that need the hardware
+collect_ignore = ["test.py", "test_gamepad.py"]
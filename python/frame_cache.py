@@ -0,0 +1,57 @@
+from typing import final
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from model import Gamepad
+from codec import frame
+
+@final
+class FrameCache:
+    """
+    Bounded LRU cache of framed wire bytes (COBS/R + CRC-8 + delimiter),
+    keyed by the gamepad state or by the raw HID report.
+    Macros reuse a small set of states, so most frames become a dict lookup.
+    """
+    __slots__ = ("_frames", "_maxsize", "hits", "misses", "evictions")
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0.")
+        self._frames: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __str__(self) -> str:
+        return f"size={len(self._frames)}/{self._maxsize} hits={self.hits} misses={self.misses} evictions={self.evictions}"
+
+    def _get(self, key: Hashable) -> bytes | None:
+        data = self._frames.get(key)
+        if data is not None:
+            self.hits += 1
+            self._frames.move_to_end(key)
+        return data
+
+    def _put(self, key: Hashable, data: bytes) -> bytes:
+        self.misses += 1
+        self._frames[key] = data
+        if len(self._frames) > self._maxsize:
+            self._frames.popitem(last = False)
+            self.evictions += 1
+        return data
+
+    def encode(self, gamepad: Gamepad) -> bytes:
+        """Return the framed bytes for the current state of the gamepad."""
+        key = (gamepad.buttons, gamepad.hat_switch, gamepad.left_stick, gamepad.right_stick)
+        return self._get(key) or self._put(key, frame.encode(gamepad.to_hid_report()))
+
+    def encode_report(self, report: bytes) -> bytes:
+        """Return the framed bytes for a raw HID report."""
+        return self._get(report) or self._put(report, frame.encode(report))
+
+    def clear(self) -> None:
+        self._frames.clear()
@@ -0,0 +1,93 @@
+from typing import NamedTuple, final
+from collections import deque
+from collections.abc import Callable
+import atexit
+import json
+
+from stats import Histogram
+
+# (resolution, limit) of the wait stage, which lasts as long as the segments, up to a minute.
+# The other stages take microseconds and use the default Histogram.
+_STAGE_HISTOGRAMS = {"wait": (1e-3, 60.0)}
+
+class TraceRecord(NamedTuple):
+    kind: str       # "frame" (Player) or "relay" (Relay)
+    time: float     # Write time
+    latency: float  # Lateness behind the deadline, or read to write time
+    size: int       # Bytes written
+
+@final
+class Instrumentation:
+    """
+    Per-stage timers, counters and an optional per-frame trace for Player and Relay.
+
+    Pass an instance as instrument= to enable it. Without one, the loops only check
+    for None, so disabled instrumentation costs close to nothing.
+    Stages are e.g. "run" (waiting for the next segment), "report", "frame", "wait" and "write".
+    The trace keeps only the last trace_size records.
+    """
+    __slots__ = ("stages", "counters", "trace", "late_threshold")
+
+    def __init__(self, trace_size: int = 0, late_threshold: float = 0.001) -> None:
+        self.stages: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        self.trace: deque[TraceRecord] | None = deque(maxlen = trace_size) if trace_size else None
+        self.late_threshold = late_threshold
+
+    def time(self, stage: str, seconds: float) -> None:
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(*_STAGE_HISTOGRAMS.get(stage, ()))
+        histogram.add(seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, kind: str, time: float, latency: float, size: int) -> None:
+        if self.trace is not None:
+            self.trace.append(TraceRecord(kind, time, latency, size))
+
+    def to_dict(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "stages": {
+                name: {
+                    "count": h.count,
+                    "total": h.total,
+                    "mean": h.mean,
+                    "p50": h.percentile(50),
+                    "p99": h.percentile(99),
+                    "max": h.max,
+                }
+                for name, h in self.stages.items()
+            },
+        }
+
+    def __str__(self) -> str:
+        lines = [" ".join(f"{name}={n}" for name, n in self.counters.items())]
+        lines.extend(
+            f"{name}: count={h.count} total={h.total * 1000:0.3f}ms {h}" for name, h in self.stages.items()
+        )
+        return "\n".join(lines)
+
+class JsonLinesExporter:
+    """Write the trace records and then the statistics to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def __call__(self, instrumentation: Instrumentation) -> None:
+        with open(self._path, "w") as file:
+            for record in instrumentation.trace or ():
+                file.write(json.dumps(record._asdict()) + "\n")
+            file.write(json.dumps(instrumentation.to_dict()) + "\n")
+
+def _print(instrumentation: Instrumentation) -> None:
+    print(instrumentation)
+
+def export_on_exit(
+    instrumentation: Instrumentation,
+    exporter: Callable[[Instrumentation], object] = _print,
+) -> None:
+    """Export the instrumentation when the interpreter exits (by default, print the statistics)."""
+    atexit.register(exporter, instrumentation)
@@ -0,0 +1,110 @@
+from typing import NamedTuple
+from collections import deque
+from collections.abc import Iterable, Generator
+
+from model import Gamepad
+from frame_cache import FrameCache
+
+BAUD = 115200
+BITS_PER_BYTE = 10 # Start bit + 8 data bits + stop bit
+REPORT_SIZE = 8 # Bytes of a HID report
+
+class LinkViolation(NamedTuple):
+    index: int
+    time: float
+    duration: float
+    wire_time: float # Time to transmit the frame, longer than the segment
+
+class LinkReport(NamedTuple):
+    segments: int
+    violations: list[LinkViolation]
+    total_time: float
+    min_total_time: float   # Total time if every segment lasted at least its wire time
+    wire_time: float
+    peak_utilization: float # Maximum over any window of the given length
+    average_utilization: float
+
+    def __str__(self) -> str:
+        return (
+            f"segments={self.segments} undeliverable={len(self.violations)} "
+            f"total={self.total_time:0.3f}s min_total={self.min_total_time:0.3f}s "
+            f"utilization(avg={self.average_utilization:0.1%} peak={self.peak_utilization:0.1%})"
+        )
+
+def wire_time(size: int, baud: int = BAUD) -> float:
+    """Return the time to transmit size bytes over the serial link."""
+    return size * BITS_PER_BYTE / baud
+
+def analyze(
+    segments: Iterable[tuple[Gamepad, float]],
+    baud: int = BAUD,
+    window: float = 0.1,
+    cache: FrameCache | None = None,
+) -> LinkReport:
+    """
+    Check whether each segment (e.g. from _MacroBuilder.run()) lasts long enough for its
+    framed report to be transmitted before the next one is due. Shorter segments make
+    the following frames queue up behind it, and the firmware's single buffer drops data.
+    """
+    cache = cache or FrameCache()
+    violations: list[LinkViolation] = []
+    total_time = min_total_time = total_wire_time = 0.0
+    peak = 0.0 # Maximum wire time within a window
+    # (start time, wire time) of the frames within the current window
+    recent: deque[tuple[float, float]] = deque()
+    recent_wire_time = 0.0
+    count = 0
+    for index, (gamepad, duration) in enumerate(segments):
+        count += 1
+        frame_wire_time = wire_time(len(cache.encode(gamepad)), baud)
+        if frame_wire_time > duration:
+            violations.append(LinkViolation(index, total_time, duration, frame_wire_time))
+
+        recent.append((total_time, frame_wire_time))
+        recent_wire_time += frame_wire_time
+        while recent[0][0] <= total_time - window:
+            recent_wire_time -= recent.popleft()[1]
+        peak = max(peak, recent_wire_time)
+
+        total_time += duration
+        min_total_time += max(duration, frame_wire_time)
+        total_wire_time += frame_wire_time
+
+    span = min(window, total_time)
+    return LinkReport(
+        count,
+        violations,
+        total_time,
+        min_total_time,
+        total_wire_time,
+        min(peak / span, 1.0) if span else 0.0,
+        total_wire_time / total_time if total_time else 0.0,
+    )
+
+def fit(
+    segments: Iterable[tuple[Gamepad, float]],
+    baud: int = BAUD,
+    merge: bool = False,
+    cache: FrameCache | None = None,
+) -> Generator[tuple[Gamepad, float], None, None]:
+    """
+    Pace segments so that every frame can be transmitted before the next one is sent.
+    By default, segments shorter than their wire time are stretched (the macro becomes longer).
+    With merge=True, they are skipped and their duration is added to the previous segment,
+    which keeps the total time but drops those states.
+    """
+    cache = cache or FrameCache()
+    pending: Gamepad | None = None
+    pending_duration = 0.0
+    for gamepad, duration in segments:
+        frame_wire_time = wire_time(len(cache.encode(gamepad)), baud)
+        if not merge:
+            yield gamepad, max(duration, frame_wire_time)
+        elif duration < frame_wire_time and pending is not None:
+            pending_duration += duration
+        else:
+            if pending is not None:
+                yield pending, pending_duration
+            pending, pending_duration = gamepad.copy(), duration
+    if pending is not None:
+        yield pending, pending_duration
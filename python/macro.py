@@ -1,8 +1,12 @@
 from typing import Self, TypeAlias, NamedTuple
-from collections.abc import Callable, Iterable, Generator
+from collections.abc import Callable, Iterable, Iterator, Generator
+import bisect
+import heapq
 import itertools
 
 from model import Gamepad, Button, HatSwitch, Vec2
+from timeline import TimedEvent, TimedRepeat, TimedItem, Timeline, Repeating, Overlay, concat, event_time, expand, iter_timeline
+import bytecode
 
 class InputEvent:
     __slots__ = ("modifier",)
@@ -16,10 +20,6 @@ class BeginEvent(InputEvent):
 class EndEvent(InputEvent):
     __slots__ = ()
 
-class TimedEvent(NamedTuple):
-    time: float
-    event: InputEvent
-
 class InputHandle():
     __slots__ = ("_modifiers",)
 
@@ -39,37 +39,83 @@ class InputHandle():
             (EndEvent(i) for i in self._modifiers),
         ))
 
+    def __mul__(self, count: int):
+        return Repeat(self, count)
+
+class Repeat:
+    """
+    Repeat the input sequence count times.
+    Unlike tuple/list multiplication, the sequence is kept only once until it is run.
+    """
+    __slots__ = ("sequence", "count")
+
+    def __init__(self, sequence: "NestedInputSequence", count: int) -> None:
+        if not isinstance(count, int):
+            raise ValueError("Count must be an integer.")
+        if count < 0:
+            raise ValueError("Count must not be negative.")
+        self.sequence = sequence
+        self.count = count
+
+class _ButtonModifier:
+    __slots__ = ("button",)
+
+    def __init__(self, button: Button) -> None:
+        self.button = button
+
+    def __call__(self, gamepad: Gamepad):
+        gamepad.buttons |= self.button
+
+class _HatSwitchModifier:
+    __slots__ = ("hat_switch",)
+
+    def __init__(self, hat_switch: HatSwitch) -> None:
+        self.hat_switch = hat_switch
+
+    def __call__(self, gamepad: Gamepad):
+        gamepad.hat_switch |= self.hat_switch
+
+class _LeftStickModifier:
+    __slots__ = ("pos",)
+
+    def __init__(self, pos: Vec2) -> None:
+        self.pos = pos
+
+    def __call__(self, gamepad: Gamepad):
+        gamepad.left_stick = self.pos
+
+class _RightStickModifier:
+    __slots__ = ("pos",)
+
+    def __init__(self, pos: Vec2) -> None:
+        self.pos = pos
+
+    def __call__(self, gamepad: Gamepad):
+        gamepad.right_stick = self.pos
+
 class ButtonPressHandle(InputHandle):
     __slots__ = ()
 
     def __init__(self, button: Button) -> None:
-        def modifier(gamepad: Gamepad):
-            gamepad.buttons |= button
-        super().__init__(modifier)
+        super().__init__(_ButtonModifier(button))
 
 class HatSwitchPressHandle(InputHandle):
     __slots__ = ()
 
     def __init__(self, hat_switch: HatSwitch) -> None:
-        def modifier(gamepad: Gamepad):
-            gamepad.hat_switch |= hat_switch
-        super().__init__(modifier)
+        super().__init__(_HatSwitchModifier(hat_switch))
 
 class LeftstickMoveHandle(InputHandle):
     __slots__ = ()
 
     def __init__(self, pos: Vec2) -> None:
-        def modifier(gamepad: Gamepad):
-            gamepad.left_stick = pos
-        super().__init__(modifier)
+        super().__init__(_LeftStickModifier(pos))
 
 class RightStickMoveHandle(InputHandle):
     __slots__ = ()
 
     def __init__(self, pos: Vec2) -> None:
-        def modifier(gamepad: Gamepad):
-            gamepad.right_stick = pos
-        super().__init__(modifier)
+        super().__init__(_RightStickModifier(pos))
 
 class LeftStickPressHandle(ButtonPressHandle):
     __slots__ = ()
@@ -124,86 +170,429 @@ def flatten(data: Iterable[object]):
             yield obj
 
 NestedInputSequence: TypeAlias = (
-    InputHandle | InputEvent | float | int |
+    InputHandle | InputEvent | Repeat | float | int |
     list["NestedInputSequence"] |
     tuple["NestedInputSequence", ...] |
     Generator["NestedInputSequence", None, None]
 )
 
+def _add_bits(counts: dict[int, int], mask: int) -> int:
+    """Increment the reference count of each bit and return the bits that became set."""
+    added = 0
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        count = counts.get(bit, 0)
+        counts[bit] = count + 1
+        if not count:
+            added |= bit
+    return added
+
+def _remove_bits(counts: dict[int, int], mask: int) -> int:
+    """Decrement the reference count of each bit and return the bits that became clear."""
+    removed = 0
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        count = counts[bit] - 1
+        counts[bit] = count
+        if not count:
+            removed |= bit
+    return removed
+
+class _ModifierState:
+    """
+    The set of active modifiers, kept incrementally.
+
+    Buttons and hat switch are reference-counted bit masks and each stick is the
+    last active writer, which gives the same result as resetting the gamepad and
+    applying every active modifier in begin order. Other modifiers fall back to that.
+    """
+    __slots__ = (
+        "_seq", "_active", "_begins", "_others",
+        "_button_counts", "_buttons", "_hat_switch_counts", "_hat_switch",
+        "_left_sticks", "_right_sticks",
+    )
+
+    def __init__(self) -> None:
+        self._seq = 0
+        self._active: dict[int, Callable[[Gamepad], None]] = {} # In begin order
+        self._begins: dict[Callable[[Gamepad], None], list[int]] = {}
+        self._others = 0
+        self._button_counts: dict[int, int] = {}
+        self._buttons = 0
+        self._hat_switch_counts: dict[int, int] = {}
+        self._hat_switch = 0
+        self._left_sticks: dict[int, Vec2] = {}
+        self._right_sticks: dict[int, Vec2] = {}
+
+    def begin(self, modifier: Callable[[Gamepad], None]) -> None:
+        seq = self._seq
+        self._seq = seq + 1
+        self._active[seq] = modifier
+        begins = self._begins.get(modifier)
+        if begins is None:
+            self._begins[modifier] = [seq]
+        else:
+            begins.append(seq)
+
+        t = type(modifier)
+        if t is _ButtonModifier:
+            self._buttons |= _add_bits(self._button_counts, int(modifier.button))
+        elif t is _HatSwitchModifier:
+            self._hat_switch |= _add_bits(self._hat_switch_counts, int(modifier.hat_switch))
+        elif t is _LeftStickModifier:
+            self._left_sticks[seq] = modifier.pos
+        elif t is _RightStickModifier:
+            self._right_sticks[seq] = modifier.pos
+        else:
+            self._others += 1
+
+    def end(self, modifier: Callable[[Gamepad], None]) -> None:
+        # Like list.remove(), the earliest begin of the modifier ends
+        begins = self._begins.get(modifier)
+        if not begins:
+            raise ValueError("Modifier ended without being begun")
+        seq = begins.pop(0)
+        if not begins:
+            del self._begins[modifier]
+        del self._active[seq]
+
+        t = type(modifier)
+        if t is _ButtonModifier:
+            self._buttons &= ~_remove_bits(self._button_counts, int(modifier.button))
+        elif t is _HatSwitchModifier:
+            self._hat_switch &= ~_remove_bits(self._hat_switch_counts, int(modifier.hat_switch))
+        elif t is _LeftStickModifier:
+            del self._left_sticks[seq]
+        elif t is _RightStickModifier:
+            del self._right_sticks[seq]
+        else:
+            self._others -= 1
+
+    def copy(self) -> "_ModifierState":
+        state = _ModifierState.__new__(_ModifierState)
+        state._seq = self._seq
+        state._active = self._active.copy()
+        state._begins = {modifier: begins.copy() for modifier, begins in self._begins.items()}
+        state._others = self._others
+        state._button_counts = self._button_counts.copy()
+        state._buttons = self._buttons
+        state._hat_switch_counts = self._hat_switch_counts.copy()
+        state._hat_switch = self._hat_switch
+        state._left_sticks = self._left_sticks.copy()
+        state._right_sticks = self._right_sticks.copy()
+        return state
+
+    def apply(self, gamepad: Gamepad) -> None:
+        if self._others:
+            gamepad.reset()
+            for modifier in self._active.values():
+                modifier(gamepad)
+            return
+        if gamepad.buttons != self._buttons:
+            gamepad.buttons = Button(self._buttons)
+        if gamepad.hat_switch != self._hat_switch:
+            gamepad.hat_switch = HatSwitch(self._hat_switch)
+        gamepad.left_stick = next(reversed(self._left_sticks.values())) if self._left_sticks else Vec2.ZERO
+        gamepad.right_stick = next(reversed(self._right_sticks.values())) if self._right_sticks else Vec2.ZERO
+
+def coalesce(segments: Iterable[tuple[Gamepad, float]]) -> Generator[tuple[Gamepad, float], None, None]:
+    """
+    Merge adjacent segments that encode to the same HID report by adding up their durations,
+    e.g. a modifier that ends and begins again at the same time, or stick positions that
+    round to the same bytes. Each yielded Gamepad is a copy, unlike run().
+    """
+    pending: Gamepad | None = None
+    pending_report = b""
+    pending_duration = 0
+    for gamepad, duration in segments:
+        report = gamepad.to_hid_report()
+        if pending is not None and report == pending_report:
+            pending_duration += duration
+            continue
+        if pending is not None:
+            yield pending, pending_duration
+        pending, pending_report, pending_duration = gamepad.copy(), report, duration
+    if pending is not None:
+        yield pending, pending_duration
+
+class DroppedSegment(NamedTuple):
+    time: float
+    duration: float
+    gamepad: Gamepad
+
+_NANOSECONDS = 1_000_000_000
+
 class _MacroBuilder:
     def __init__(self,
-        timed_events: list[TimedEvent],
+        timeline: Timeline,
         total_time: float,
         default_duration: float,
+        tick: float | None = None,
     ) -> None:
-        self._timed_events = timed_events
+        self._timeline = timeline
         self._total_time = total_time
         self._default_duration = default_duration
+        # With a tick, times are integer nanoseconds and run() quantizes them to the tick
+        self._tick = tick
+        self._tick_ns = None if tick is None else round(tick * _NANOSECONDS)
+        if self._tick_ns is not None and self._tick_ns <= 0:
+            raise ValueError("Tick must be at least 1 ns.")
+        # (times, states): the modifier state before the events at each time
+        self._checkpoints: tuple[list[float], list[_ModifierState]] | None = None
 
     def __add__(self, other: Self):
+        if self._tick_ns != other._tick_ns:
+            raise ValueError("Cannot concatenate macros with different ticks")
         return self.__class__(
-            [*itertools.chain(
-                self._timed_events,
-                map(lambda e: TimedEvent(e.time + self._total_time, e.event), other._timed_events)
-            )],
+            concat(self._timeline, other._timeline, self._total_time),
             self._total_time + other._total_time,
-            0
+            0,
+            self._tick,
         )
 
-    def build(self, *input_sequence: NestedInputSequence) -> Self:
-        timed_events: list[TimedEvent] = []
+    def _time(self, duration: float) -> float:
+        return duration if self._tick_ns is None else round(duration * _NANOSECONDS)
+
+    def _iter_sequence(self, input_sequence: NestedInputSequence) -> Generator[TimedItem, None, float]:
+        """Yield the timed items of the input sequence in time order and return the elapsed time."""
         elapsed_time = 0
         for obj in flatten(input_sequence):
             if isinstance(obj, (float, int)):
-                elapsed_time += obj
+                elapsed_time += self._time(obj)
             elif isinstance(obj, InputEvent):
-                timed_events.append(TimedEvent(elapsed_time, obj))
+                yield TimedEvent(elapsed_time, obj)
             elif isinstance(obj, InputHandle):
                 if not self._default_duration:
                     raise ValueError("No default duration is set")
                 for obj in obj >> self._default_duration:
                     if isinstance(obj, (float, int)):
-                        elapsed_time += obj
+                        elapsed_time += self._time(obj)
                     else:
-                        timed_events.append(TimedEvent(elapsed_time, obj))
+                        yield TimedEvent(elapsed_time, obj)
+            elif isinstance(obj, Repeat):
+                items, duration = self._build_sequence((obj.sequence,))
+                if obj.count and items:
+                    yield TimedRepeat(elapsed_time, items, duration, obj.count)
+                elapsed_time += duration * obj.count
             else:
                 raise ValueError(f"Invalid type: {type(obj)}")
+        return elapsed_time
+
+    def _build_sequence(self, input_sequence: NestedInputSequence) -> tuple[list[TimedItem], float]:
+        timed_items: list[TimedItem] = []
+        timed_item_iterator = self._iter_sequence(input_sequence)
+        append = timed_items.append
+        try:
+            while True:
+                append(next(timed_item_iterator))
+        except StopIteration as stop:
+            return timed_items, stop.value
+
+    def build(self, *input_sequence: NestedInputSequence) -> Self:
+        timed_items, elapsed_time = self._build_sequence(input_sequence)
+        timeline: Timeline = timed_items
+        if any(type(item) is TimedRepeat for item in timed_items):
+            timeline = Repeating(timed_items)
 
         if self._total_time > 0:
-            self._timed_events.extend(timed_events)
-            self._timed_events.sort(key = lambda timed_event: timed_event.time)
+            # Overlaid timelines are merged lazily in run() instead of sorting them here
+            timelines = self._timeline.timelines if type(self._timeline) is Overlay else [self._timeline]
+            self._timeline = Overlay([*timelines, timeline])
             self._total_time = self._total_time if self._total_time >= elapsed_time else elapsed_time
         else:
-            self._timed_events = timed_events
+            self._timeline = timeline
             self._total_time = elapsed_time
+        self._checkpoints = None
         return self
 
-    def run(self):
+    def stream(self, *input_sequence: NestedInputSequence, dropped: list[DroppedSegment] | None = None):
+        """
+        Same as build(*input_sequence).run(dropped), but the input sequence is consumed
+        while running instead of being built first, so it may be an endless generator
+        (e.g. one with a while True loop) and the memory use does not grow with its length.
+        Events already built are merged in, and the builder itself is not modified.
+        """
+        # run() reads the total time of this builder only after the last event
+        builder = self.__class__(self._timeline, self._total_time, self._default_duration, self._tick)
+
+        def timed_items() -> Generator[TimedItem, None, None]:
+            elapsed_time = yield from self._iter_sequence(input_sequence)
+            if builder._total_time < elapsed_time:
+                builder._total_time = elapsed_time
+
+        timed_events: Iterator[TimedEvent] = expand(timed_items())
+        if self._total_time > 0:
+            timed_events = heapq.merge(iter_timeline(self._timeline), timed_events, key = event_time)
+        if self._tick_ns is not None:
+            return builder._run_ticks(dropped, _ModifierState(), timed_events, 0)
+        return builder._run(_ModifierState(), timed_events, 0)
+
+    def build_index(self, events: int = 1024, interval: float | None = None) -> Self:
+        """
+        Record checkpoints of the modifier state every events events, or every interval
+        seconds if that comes first, so that run(start=...) and state_at() only replay
+        the events since the last checkpoint. It is built on first use if not called.
+        """
+        if events <= 0:
+            raise ValueError("Events must be greater than 0.")
+        interval = None if interval is None else self._time(interval)
+        state = _ModifierState()
+        times = [0]
+        states = [state.copy()]
+        last_time = 0
+        count = 0
+        for time, event in iter_timeline(self._timeline):
+            if time > last_time:
+                if count >= events or (interval is not None and time - times[-1] >= interval):
+                    times.append(time)
+                    states.append(state.copy())
+                    count = 0
+                last_time = time
+            elif time < times[-1]:
+                # Rounded offsets of repeated and concatenated parts can put an event slightly
+                # before earlier ones. Resuming by time is only exact at checkpoints that no
+                # later event precedes.
+                while times[-1] > time:
+                    times.pop()
+                    states.pop()
+            if type(event) is BeginEvent:
+                state.begin(event.modifier)
+            else:
+                state.end(event.modifier)
+            count += 1
+        self._checkpoints = (times, states)
+        return self
+
+    def _seek(self, start: float) -> tuple[_ModifierState, Iterator[TimedEvent]]:
+        """Return the modifier state at start (in the timebase) and the events after it."""
+        if not 0 <= start <= self._total_time:
+            raise ValueError("Start time is out of range.")
+        if self._checkpoints is None:
+            self.build_index()
+        times, states = self._checkpoints
+        index = bisect.bisect_right(times, start) - 1
+        state = states[index].copy()
+        timed_events = iter_timeline(self._timeline, times[index])
+        for timed_event in timed_events:
+            time, event = timed_event
+            if time > start:
+                return state, itertools.chain((timed_event,), timed_events)
+            if type(event) is BeginEvent:
+                state.begin(event.modifier)
+            else:
+                state.end(event.modifier)
+        return state, timed_events
+
+    def state_at(self, time: float) -> Gamepad:
+        """Return the gamepad state at the given time (in seconds), including the events at that time."""
+        state, _ = self._seek(self._time(time))
+        gamepad = Gamepad()
+        state.apply(gamepad)
+        return gamepad
+
+    def run(self, dropped: list[DroppedSegment] | None = None, start: float = 0):
+        """
+        Yield (gamepad, duration) for each segment between event times.
+        The same Gamepad instance is updated and yielded each time.
+
+        If start (in seconds) is given, the run resumes at that time from the nearest
+        checkpoint (see build_index()), and the first segment begins there.
+
+        If the macro has a tick, segment boundaries are quantized to it and every
+        duration is a whole number of ticks. Segments that become empty are merged
+        into the next one (or left out at the end) and appended to dropped if given.
+        """
+        start = self._time(start)
+        if start:
+            state, timed_events = self._seek(start)
+        else:
+            state, timed_events = _ModifierState(), iter_timeline(self._timeline)
+        if self._tick_ns is not None:
+            return self._run_ticks(dropped, state, timed_events, start)
+        return self._run(state, timed_events, start)
+
+    def _run(self, state: _ModifierState, timed_events: Iterator[TimedEvent], start_time: float):
         # result: list[str] = []
-        modifiers: list[Callable[[Gamepad], None]] = []
         gamepad = Gamepad()
-        start_time = 0
-        for time, event in self._timed_events:
+        for time, event in timed_events:
             if start_time != time:
-                for modifier in modifiers:
-                    modifier(gamepad)
+                state.apply(gamepad)
                 # result.append(f"{gamepad} >> {time - start_time:0.2f}")
                 yield gamepad, time - start_time
                 start_time = time
-                gamepad.reset()
             if type(event) is BeginEvent:
-                modifiers.append(event.modifier)
+                state.begin(event.modifier)
             else:
-                modifiers.remove(event.modifier)
-        for modifier in modifiers:
-            modifier(gamepad)
+                state.end(event.modifier)
+        state.apply(gamepad)
         # result.append(f"{gamepad} >> {self._total_time - start_time:0.2f}")
         yield gamepad, self._total_time - start_time
         # print(*result, sep = "\n")
 
-
-def Macro(default_duration: float | None = None):
-    return _MacroBuilder([], 0, default_duration or 0)
+    def _run_ticks(self,
+        dropped: list[DroppedSegment] | None,
+        state: _ModifierState,
+        timed_events: Iterator[TimedEvent],
+        start_time: int,
+    ):
+        gamepad = Gamepad()
+        tick = self._tick
+        tick_ns = self._tick_ns
+        half_tick_ns = tick_ns // 2
+
+        def drop(start_time: int, end_time: int) -> None:
+            if dropped is not None and start_time != end_time:
+                snapshot = Gamepad()
+                state.apply(snapshot)
+                dropped.append(DroppedSegment(
+                    start_time / _NANOSECONDS, (end_time - start_time) / _NANOSECONDS, snapshot
+                ))
+
+        start_tick = (start_time + half_tick_ns) // tick_ns
+        for time, event in timed_events:
+            if start_time != time:
+                time_tick = (time + half_tick_ns) // tick_ns
+                if time_tick != start_tick:
+                    state.apply(gamepad)
+                    yield gamepad, (time_tick - start_tick) * tick
+                    start_tick = time_tick
+                else:
+                    drop(start_time, time)
+                start_time = time
+            if type(event) is BeginEvent:
+                state.begin(event.modifier)
+            else:
+                state.end(event.modifier)
+        total_tick = (self._total_time + half_tick_ns) // tick_ns
+        if total_tick == start_tick:
+            # There is no next segment to merge it into
+            drop(start_time, self._total_time)
+            return
+        state.apply(gamepad)
+        yield gamepad, (total_tick - start_tick) * tick
+
+    def compile(self, loop_folding: bool = True) -> bytes:
+        """
+        Compile the built macro into the compact format described in macro_specification.md.
+        Identical adjacent segments are coalesced, and repeated segments are folded into
+        loops unless loop_folding is False.
+        """
+        return bytecode.compile(coalesce(self.run()), loop_folding)
+
+    def compile_with_stats(self, loop_folding: bool = True) -> tuple[bytes, bytecode.CompileStats]:
+        """Same as compile() but also returns the compression statistics."""
+        return bytecode.compile_with_stats(coalesce(self.run()), loop_folding)
+
+
+def Macro(default_duration: float | None = None, tick: float | None = None):
+    """
+    Create a macro builder.
+    tick (in seconds) switches to an integer timebase quantized to that period,
+    e.g. 0.001 for 1 ms or the USB polling interval of the console.
+    """
+    return _MacroBuilder([], 0, default_duration or 0, tick)
 
 
 # Macro().build(
@@ -0,0 +1,157 @@
+from typing import final
+from collections.abc import Callable
+import functools
+import hashlib
+import inspect
+import mmap
+import os
+import tempfile
+import time
+
+# Bump when the layout of the cache changes, to invalidate old entries.
+# Changes of the compiler itself are detected by toolchain_hash().
+FORMAT_VERSION = 1
+_SUFFIX = ".bin"
+
+# Sources that compiled macros depend on, relative to this directory
+_TOOLCHAIN_FILES = ("macro.py", "timeline.py", "recording.py")
+_TOOLCHAIN_PACKAGES = ("bytecode", "codec", "model")
+
+@functools.cache
+def toolchain_hash() -> str:
+    """Return a hash of the sources of the DSL, the compiler and the codecs, read once per process."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.join(directory, name) for name in _TOOLCHAIN_FILES]
+    for package in _TOOLCHAIN_PACKAGES:
+        package_directory = os.path.join(directory, package)
+        paths.extend(sorted(
+            os.path.join(package_directory, name) for name in os.listdir(package_directory) if name.endswith(".py")
+        ))
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def write_atomic(path: str, write: Callable[[str], object]) -> None:
+    """Call write(temp_path) and move the result to path, so that readers never see a partial file."""
+    fd, temp_path = tempfile.mkstemp(dir = os.path.dirname(path) or ".", suffix = ".tmp")
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+@final
+class MacroCache:
+    """
+    Directory of compiled macros (see _MacroBuilder.compile()), keyed by a hash of the
+    source of the module that builds the macro, the build parameters and the toolchain.
+    A hit memory-maps the cached bytecode, so the DSL is not run at all:
+
+        code = cache.compile(make_macro, 100)
+        Player(ser.write, encode=bytes).play(bytecode.interpret(code, framed=True))
+
+    Entries older than max_age seconds are removed, then the least recently used ones
+    until the directory fits in max_size bytes.
+    """
+
+    def __init__(self,
+        directory: str = ".macro_cache",
+        max_size: int = 256 * 1024 * 1024,
+        max_age: float | None = 30 * 24 * 60 * 60,
+    ) -> None:
+        self._directory = directory
+        self._max_size = max_size
+        self._max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def __str__(self) -> str:
+        return f"hits={self.hits} misses={self.misses}"
+
+    @staticmethod
+    def key(source: str | bytes, *args: object, **kwargs: object) -> str:
+        """Return the key of a macro source and its parameters (which must have a stable repr())."""
+        digest = hashlib.sha256()
+        digest.update(f"{FORMAT_VERSION}\0{toolchain_hash()}\0".encode())
+        digest.update(source.encode() if isinstance(source, str) else source)
+        digest.update(f"\0{args!r}\0{sorted(kwargs.items())!r}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key + _SUFFIX)
+
+    def get(self, key: str) -> mmap.mmap | bytes | None:
+        """Return the cached bytecode memory-mapped, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                # An empty file cannot be mapped
+                code = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) if size else b""
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # The modification time records the last use for eviction
+        os.utime(path)
+        self.hits += 1
+        return code
+
+    def put(self, key: str, code: bytes) -> None:
+        def write(temp_path: str) -> None:
+            with open(temp_path, "wb") as file:
+                file.write(code)
+        write_atomic(self._path(key), write)
+        self.evict()
+
+    def compile(self, build: Callable[..., object], *args: object, **kwargs: object) -> mmap.mmap | bytes:
+        """
+        Return the compiled bytecode of build(*args, **kwargs), which returns a macro builder.
+        The key covers the source of the whole module defining build, so editing any helper
+        in the script invalidates the entry.
+        """
+        module = inspect.getmodule(build)
+        source = inspect.getsource(module if module is not None else build)
+        key = self.key(f"{build.__qualname__}\0{source}", *args, **kwargs)
+        code = self.get(key)
+        if code is None:
+            code = build(*args, **kwargs).compile()
+            self.put(key, code)
+        return code
+
+    def evict(self) -> None:
+        now = time.time()
+        entries: list[tuple[float, int, str]] = []
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if not entry.name.endswith(_SUFFIX):
+                    continue
+                stat = entry.stat()
+                if self._max_age is not None and now - stat.st_mtime > self._max_age:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def clear(self) -> None:
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.name.endswith(_SUFFIX):
+                    self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass # Removed by another process, or mapped (Windows does not allow removing it)
@@ -0,0 +1,89 @@
+from typing import Self, final
+from collections.abc import Iterable, Iterator
+
+import numpy as np # pip install numpy
+
+from .gamepad import Gamepad, _HatSwitch_to_HID_value, _HID_value_to_HatSwitch
+from .stick import _AXIS_VALUES
+
+REPORT_SIZE = 8
+
+# HatSwitch bits -> HID value, and HID value -> HatSwitch bits (out-of-range values are neutral)
+_HAT_SWITCH_TO_HID = np.array(
+    [_HatSwitch_to_HID_value[i] for i in range(16)], dtype = np.uint8
+)
+_HID_TO_HAT_SWITCH = np.array(
+    [int(_HID_value_to_HatSwitch.get(i, 0)) for i in range(256)], dtype = np.uint8
+)
+# Axis byte -> its midpoint value (0 for neutral)
+_AXIS_CENTERS = np.array([center for center, _ in _AXIS_VALUES], dtype = np.float32)
+
+@final
+class GamepadBatch:
+    """
+    Many gamepad states stored as arrays, converted to and from HID reports without per-state objects.
+
+    buttons: uint16 Button bits, hat_switch: uint8 HatSwitch bits, and
+    sticks: uint8 (N, 4) HID bytes of the left x, left y, right x and right y axes.
+    """
+    __slots__ = ("buttons", "hat_switch", "sticks")
+
+    def __init__(self, buttons: np.ndarray, hat_switch: np.ndarray, sticks: np.ndarray) -> None:
+        n = len(buttons)
+        if hat_switch.shape != (n,) or sticks.shape != (n, 4):
+            raise ValueError("Arrays must have the same length")
+        self.buttons = buttons.astype(np.uint16, copy = False)
+        self.hat_switch = hat_switch.astype(np.uint8, copy = False)
+        self.sticks = sticks.astype(np.uint8, copy = False)
+
+    @classmethod
+    def neutral(cls, n: int) -> Self:
+        return cls(
+            np.zeros(n, dtype = np.uint16),
+            np.zeros(n, dtype = np.uint8),
+            np.full((n, 4), 0x80, dtype = np.uint8),
+        )
+
+    @classmethod
+    def from_reports(cls, data: bytes | bytearray | memoryview | np.ndarray) -> Self:
+        """Create a batch from contiguous HID reports (N * 8 bytes)."""
+        reports = np.frombuffer(data, dtype = np.uint8).reshape(-1, REPORT_SIZE)
+        return cls(
+            reports[:, 0] | (reports[:, 1].astype(np.uint16) << 8),
+            _HID_TO_HAT_SWITCH[reports[:, 2]],
+            reports[:, 3:7].copy(),
+        )
+
+    @classmethod
+    def from_gamepads(cls, gamepads: Iterable[Gamepad]) -> Self:
+        # Sticks are quantized by Gamepad.to_hid_report(), so the bytes are identical
+        return cls.from_reports(b"".join(gamepad.to_hid_report() for gamepad in gamepads))
+
+    def to_reports(self) -> np.ndarray:
+        """Return the HID reports as a contiguous (N, 8) uint8 array, e.g. to_reports().tobytes()."""
+        reports = np.zeros((len(self), REPORT_SIZE), dtype = np.uint8)
+        reports[:, 0] = self.buttons & 0xff
+        reports[:, 1] = self.buttons >> 8
+        reports[:, 2] = _HAT_SWITCH_TO_HID[self.hat_switch & 0xf]
+        reports[:, 3:7] = self.sticks
+        return reports
+
+    def stick_values(self) -> np.ndarray:
+        """Return the sticks as float32 (N, 4) values in [-1, 1], 0 for neutral."""
+        return _AXIS_CENTERS[self.sticks]
+
+    def __len__(self) -> int:
+        return len(self.buttons)
+
+    def __getitem__(self, index: int) -> Gamepad:
+        buttons = int(self.buttons[index])
+        return Gamepad.from_hid_report(bytes((
+            buttons & 0xff,
+            buttons >> 8,
+            int(_HAT_SWITCH_TO_HID[self.hat_switch[index] & 0xf]),
+            *self.sticks[index].tolist(),
+            0,
+        )))
+
+    def __iter__(self) -> Iterator[Gamepad]:
+        return map(Gamepad.from_hid_report, map(bytes, self.to_reports()))
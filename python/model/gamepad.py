@@ -4,6 +4,7 @@ import struct
 
 from .intflag import Button, HatSwitch
 from .vector import Vec2
+from .stick import encode_stick, decode_stick
 
 @final
 class Gamepad:
@@ -56,24 +57,18 @@ class Gamepad:
         return struct.pack("<HBBBBBB",
             self.buttons,
             _HatSwitch_to_HID_value[self.hat_switch],
-            *map(
-                lambda x: round((x + 1) / 2 * 255),
-                itertools.chain(
-                    self.left_stick.clamp_magnitude(),
-                    self.right_stick.clamp_magnitude(),
-                )
-            ),
+            *encode_stick(self.left_stick),
+            *encode_stick(self.right_stick),
             0,
         )
 
     @classmethod
     def from_hid_report(cls, report: bytes) -> Self:
-        lx, ly, rx, ry = map(lambda n: round(n / 255 * 2 - 1, 2), report[3:7])
         return cls(
             Button(int.from_bytes(report[0:2], "little")),
             _HID_value_to_HatSwitch[report[2]],
-            Vec2(lx, ly),
-            Vec2(rx, ry),
+            decode_stick(report[3], report[4]),
+            decode_stick(report[5], report[6]),
         )
 
 _HatSwitch_to_HID_value = {
@@ -0,0 +1,73 @@
+from functools import lru_cache
+import math
+
+from .vector import Vec2
+
+NEUTRAL = 0x80
+
+def _encode_axis(value: float) -> int:
+    return round((value + 1) / 2 * 255)
+
+@lru_cache(maxsize = 1 << 16)
+def encode_stick(pos: Vec2) -> tuple[int, int]:
+    """
+    Return the HID bytes (x, y) of a stick position, clamped to the unit circle.
+    Results are memoized by position, since macros reuse the same positions in every frame.
+    """
+    x, y = pos.x, pos.y
+    mag = math.hypot(x, y)
+    if mag > 1:
+        # Same arithmetic as Vec2.clamp_magnitude(), without creating a Vec2
+        scale = 1 / mag
+        x, y = x * scale, y * scale
+    return _encode_axis(x), _encode_axis(y)
+
+def _axis_values(byte: int) -> tuple[float, float]:
+    """Return (center, inner) values of an axis byte: its midpoint and the value closest to zero."""
+    if byte == NEUTRAL:
+        return 0, 0
+    center = byte / 255 * 2 - 1
+    if _encode_axis(center) != byte:
+        raise AssertionError(f"Axis byte {byte} does not round-trip")
+    # Bisect between the center and the rounding boundary towards zero
+    inner = center
+    outer = (byte - (0.5 if byte > NEUTRAL else -0.5)) / 255 * 2 - 1
+    for _ in range(64):
+        middle = (inner + outer) / 2
+        if middle in (inner, outer):
+            break
+        if _encode_axis(middle) == byte:
+            inner = middle
+        else:
+            outer = middle
+    if _encode_axis(outer) == byte:
+        inner = outer
+    return center, inner
+
+_AXIS_VALUES = tuple(_axis_values(byte) for byte in range(256))
+
+@lru_cache(maxsize = 1 << 16)
+def decode_stick(x: int, y: int) -> Vec2:
+    """
+    Return the canonical stick position of the HID bytes (x, y): the same instance for
+    the same bytes, and encode_stick() of it gives (x, y) back.
+    Bytes that no position encodes to (outside the unit circle) decode to their midpoint.
+    """
+    (center_x, inner_x), (center_y, inner_y) = _AXIS_VALUES[x], _AXIS_VALUES[y]
+    for pos in (Vec2(center_x, center_y), Vec2(inner_x, inner_y)):
+        if encode_stick(pos) == (x, y):
+            return pos
+    return Vec2(center_x, center_y)
+
+# Vec2.UP rotated by each whole degree, computed once
+_UNIT_CIRCLE = tuple(Vec2.UP.rotate(degrees) for degrees in range(360))
+
+def polar(degrees: float, magnitude: float = 1) -> Vec2:
+    """
+    Return Vec2.UP.rotate(degrees) * magnitude, e.g. for circular sweeps.
+    Whole degrees in [0, 360) with a magnitude of 1 come from a precomputed table without allocating.
+    """
+    if magnitude == 1 and type(degrees) is int and 0 <= degrees < 360:
+        return _UNIT_CIRCLE[degrees]
+    pos = Vec2.UP.rotate(degrees)
+    return pos if magnitude == 1 else pos * magnitude
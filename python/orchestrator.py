@@ -0,0 +1,105 @@
+from typing import NamedTuple
+from collections.abc import Callable, Iterable
+import threading
+import time
+
+from model import Gamepad
+from player import Player, PlaybackStats
+
+class PortResult(NamedTuple):
+    name: str
+    stats: PlaybackStats | None # None if the port failed
+    write_errors: int
+    error: BaseException | None
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"{self.name}: failed after {self.write_errors} write errors ({self.error!r})"
+        return f"{self.name}: {self.stats} write_errors={self.write_errors}"
+
+class _Port:
+    __slots__ = ("name", "_write", "_segments", "_max_errors", "_consecutive_errors", "write_errors", "result")
+
+    def __init__(self,
+        name: str,
+        write: Callable[[bytes], object],
+        segments: Iterable[tuple[Gamepad, float]],
+        max_errors: int,
+    ) -> None:
+        self.name = name
+        self._write = write
+        self._segments = segments
+        self._max_errors = max_errors
+        self._consecutive_errors = 0
+        self.write_errors = 0
+        self.result: PortResult | None = None
+
+    def write(self, data: bytes) -> None:
+        # A failed frame is skipped, the next one replaces it on the console anyway
+        try:
+            self._write(data)
+        except Exception:
+            self.write_errors += 1
+            self._consecutive_errors += 1
+            if self._consecutive_errors > self._max_errors:
+                raise
+        else:
+            self._consecutive_errors = 0
+
+    def play(self, start: float, spin_threshold: float, clock: Callable[[], float]) -> None:
+        try:
+            stats = Player(self.write, spin_threshold = spin_threshold, clock = clock).play(self._segments, start)
+            self.result = PortResult(self.name, stats, self.write_errors, None)
+        except Exception as e:
+            self.result = PortResult(self.name, None, self.write_errors, e)
+
+class Orchestrator:
+    """
+    Play macros on many serial ports at once, one thread per port, all starting at the same deadline.
+
+        orchestrator = Orchestrator()
+        for port in ports:
+            orchestrator.add(port.name, port.write, m.run()) # One run() per port
+        for result in orchestrator.run():
+            print(result)
+
+    Each port has its own Player, so a slow or failing port only delays itself.
+    Failed writes are counted and skipped; a port stops after more than max_errors in a row.
+    Busy-waiting threads would hold the GIL and delay each other, so the players only
+    sleep unless spin_threshold is given.
+    """
+
+    def __init__(self,
+        start_delay: float = 0.5,
+        spin_threshold: float = 0,
+        max_errors: int = 10,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self._start_delay = start_delay
+        self._spin_threshold = spin_threshold
+        self._max_errors = max_errors
+        self._clock = clock
+        self._ports: list[_Port] = []
+
+    def add(self, name: str, write: Callable[[bytes], object], segments: Iterable[tuple[Gamepad, float]]) -> None:
+        self._ports.append(_Port(name, write, segments, self._max_errors))
+
+    def run(self) -> list[PortResult]:
+        """Play every port and return the results in the order the ports were added."""
+        ports, self._ports = self._ports, []
+        # Threads are started before the deadline, so that they all wait for the same instant
+        start = self._clock() + self._start_delay
+        threads = [
+            threading.Thread(
+                target = port.play,
+                args = (start, self._spin_threshold, self._clock),
+                name = f"orchestrator-{port.name}",
+                daemon = True,
+            )
+            for port in ports
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [port.result for port in ports]
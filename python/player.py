@@ -0,0 +1,144 @@
+from typing import NamedTuple
+from collections.abc import Callable, Iterable, Iterator
+import time
+
+from model import Gamepad
+from stats import Histogram
+from frame_cache import FrameCache
+from instrument import Instrumentation
+
+class PlaybackStats(NamedTuple):
+    frames: int
+    lateness: Histogram # Write time - scheduled time
+    jitter: Histogram   # |Actual interval - scheduled interval|
+
+    def __str__(self) -> str:
+        return f"frames={self.frames} lateness({self.lateness}) jitter({self.jitter})"
+
+class Player:
+    """
+    Play (gamepad, duration) segments, e.g. from _MacroBuilder.run(), over a serial link.
+
+    Every frame is scheduled against an absolute deadline measured from the start,
+    so sleep overshoot and encoding time do not accumulate over the run.
+    The wait sleeps until spin_threshold before the deadline and then busy-waits.
+    Frames are encoded through a FrameCache unless another encode function is given.
+    With an Instrumentation, the time of each stage, counters and a per-frame trace are recorded.
+    """
+
+    def __init__(self,
+        write: Callable[[bytes], object],
+        encode: Callable[[Gamepad], bytes] | None = None,
+        spin_threshold: float = 0.002,
+        clock: Callable[[], float] = time.perf_counter,
+        sleep: Callable[[float], object] = time.sleep,
+        instrument: Instrumentation | None = None,
+    ) -> None:
+        self._write = write
+        self.cache = FrameCache() if encode is None else None
+        self._encode = encode or self.cache.encode
+        self._spin_threshold = spin_threshold
+        self._clock = clock
+        self._sleep = sleep
+        self._instrument = instrument
+
+    def wait_until(self, deadline: float) -> None:
+        clock = self._clock
+        remaining = deadline - clock()
+        if remaining > self._spin_threshold:
+            self._sleep(remaining - self._spin_threshold)
+        while clock() < deadline:
+            pass
+
+    def play(self, segments: Iterable[tuple[Gamepad, float]], start: float | None = None) -> PlaybackStats:
+        """
+        Write each frame at its deadline and return the timing statistics.
+        start is a clock() value to begin at (defaults to now), which allows synchronized starts.
+        Returns after the duration of the last segment has elapsed.
+        """
+        write = self._write
+        encode = self._encode
+        wait_until = self.wait_until
+        clock = self._clock
+        instrument = self._instrument
+        if instrument is not None:
+            segments, encode, wait_until, write = self._instrument_stages(segments, instrument)
+            cache_hits = self.cache.hits if self.cache is not None else 0
+        lateness = Histogram()
+        jitter = Histogram()
+        frames = 0
+
+        start = clock() if start is None else start
+        elapsed_time = 0
+        deadline = start
+        last_write_time = last_deadline = None
+        for gamepad, duration in segments:
+            # Encode before waiting, so that only the write happens at the deadline
+            data = encode(gamepad)
+            wait_until(deadline)
+            write_time = clock()
+            write(data)
+            frames += 1
+            lateness.add(write_time - deadline)
+            if instrument is not None:
+                instrument.count("frames")
+                instrument.count("bytes", len(data))
+                if write_time - deadline > instrument.late_threshold:
+                    instrument.count("late_frames")
+                instrument.record("frame", write_time, write_time - deadline, len(data))
+            if last_write_time is not None:
+                jitter.add(abs((write_time - last_write_time) - (deadline - last_deadline)))
+            last_write_time, last_deadline = write_time, deadline
+
+            elapsed_time += duration
+            deadline = start + elapsed_time
+        wait_until(deadline)
+        if instrument is not None and self.cache is not None:
+            instrument.count("cache_hits", self.cache.hits - cache_hits)
+        return PlaybackStats(frames, lateness, jitter)
+
+    def _instrument_stages(self, segments: Iterable[tuple[Gamepad, float]], instrument: Instrumentation):
+        """Wrap the segments, encode, wait and write steps to time them as stages."""
+        clock = self._clock
+
+        def timed_segments() -> Iterator[tuple[Gamepad, float]]:
+            # The time spent in the iterator, e.g. the state computation of run()
+            iterator = iter(segments)
+            while True:
+                start = clock()
+                try:
+                    segment = next(iterator)
+                except StopIteration:
+                    return
+                instrument.time("run", clock() - start)
+                yield segment
+
+        cache = self.cache
+        if cache is not None:
+            # Encoding through the report, so that report and framing can be timed separately
+            def encode(gamepad: Gamepad) -> bytes:
+                start = clock()
+                report = gamepad.to_hid_report()
+                middle = clock()
+                data = cache.encode_report(report)
+                instrument.time("report", middle - start)
+                instrument.time("frame", clock() - middle)
+                return data
+        else:
+            def encode(gamepad: Gamepad) -> bytes:
+                start = clock()
+                data = self._encode(gamepad)
+                instrument.time("encode", clock() - start)
+                return data
+
+        def wait_until(deadline: float) -> None:
+            start = clock()
+            self.wait_until(deadline)
+            instrument.time("wait", clock() - start)
+
+        def write(data: bytes) -> None:
+            start = clock()
+            self._write(data)
+            instrument.time("write", clock() - start)
+
+        return timed_segments(), encode, wait_until, write
@@ -0,0 +1,167 @@
+"""
+Compact append-only recording of HID reports.
+
+The file starts with MAGIC, followed by one record per report change:
+
+    delta time (varint, TIME_UNIT since the previous record), mask (1 byte), changed bytes
+
+Bit n of the mask is set when byte n of the report differs from the previous report,
+and only those bytes follow, in order. A mask of KEYFRAME carries the whole report;
+one is written first and then at least every keyframe_interval seconds.
+A final record with an empty mask marks the end of the recording, so that the last
+report keeps its duration.
+A record truncated by an interrupted recording is ignored on replay.
+"""
+from typing import final
+from collections.abc import Callable, Iterator
+import mmap
+import time
+
+from codec import varint
+from frame_cache import FrameCache
+from player import Player, PlaybackStats
+
+MAGIC = b"LNSR\x01"
+TIME_UNIT = 1e-6
+REPORT_SIZE = 8
+KEYFRAME = (1 << REPORT_SIZE) - 1
+
+@final
+class Recorder:
+    """Write reports to a recording file. Unchanged reports are not recorded."""
+
+    def __init__(self,
+        path: str,
+        keyframe_interval: float = 1.0,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._keyframe_interval = round(keyframe_interval / TIME_UNIT)
+        self._clock = clock
+        self._start: float | None = None
+        self._last_time = 0
+        self._last_keyframe_time = 0
+        self._last = bytes(REPORT_SIZE)
+        self.records = 0
+
+    def record(self, report: bytes, time: float | None = None) -> None:
+        """Record the report at the given clock() time (defaults to now)."""
+        if len(report) != REPORT_SIZE:
+            raise ValueError(f"report must be {REPORT_SIZE} bytes, got {len(report)}")
+        time = self._clock() if time is None else time
+        if self._start is None:
+            self._start = time
+        elif report == self._last:
+            return
+        # Times are rounded from the start, so that rounding errors do not accumulate
+        ticks = max(round((time - self._start) / TIME_UNIT), self._last_time)
+        record = varint.encode(ticks - self._last_time)
+        if not self.records or ticks - self._last_keyframe_time >= self._keyframe_interval:
+            record.append(KEYFRAME)
+            record += report
+            self._last_keyframe_time = ticks
+        else:
+            mask_index = len(record)
+            record.append(0)
+            mask = 0
+            for n, (byte, last) in enumerate(zip(report, self._last)):
+                if byte != last:
+                    mask |= 1 << n
+                    record.append(byte)
+            record[mask_index] = mask
+        self._file.write(record)
+        self._last_time = ticks
+        self._last = bytes(report)
+        self.records += 1
+
+    def close(self, time: float | None = None) -> None:
+        """Mark the end of the recording at the given clock() time (defaults to now) and close the file."""
+        if self._file.closed:
+            return
+        if self.records:
+            time = self._clock() if time is None else time
+            ticks = max(round((time - self._start) / TIME_UNIT), self._last_time)
+            self._file.write(varint.encode(ticks - self._last_time) + b"\x00")
+        self._file.close()
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+@final
+class Recording:
+    """Memory-mapped recording file. Records are decoded lazily while iterating."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError("not a recording file")
+
+    def __iter__(self) -> Iterator[tuple[float, bytes]]:
+        """Yield (time, report) for each record."""
+        data = memoryview(self._mmap)
+        size = len(data)
+        offset = len(MAGIC)
+        ticks = 0
+        report = bytearray(REPORT_SIZE)
+        try:
+            while offset < size:
+                try:
+                    delta, offset = varint.decode_from(data, offset)
+                except varint.VarintError:
+                    return
+                if offset >= size:
+                    return
+                mask = data[offset]
+                offset += 1
+                if mask == KEYFRAME:
+                    if offset + REPORT_SIZE > size:
+                        return
+                    report[:] = data[offset:offset + REPORT_SIZE]
+                    offset += REPORT_SIZE
+                else:
+                    if offset + mask.bit_count() > size:
+                        return
+                    for n in range(REPORT_SIZE):
+                        if mask >> n & 1:
+                            report[n] = data[offset]
+                            offset += 1
+                ticks += delta
+                yield ticks * TIME_UNIT, bytes(report)
+        finally:
+            data.release()
+
+    def segments(self) -> Iterator[tuple[bytes, float]]:
+        """
+        Yield (report, duration) pairs. The last report lasts until the end mark,
+        or has a duration of zero if the recording was interrupted before it.
+        """
+        last_report = last_time = end_time = None
+        for time, report in self:
+            end_time = time
+            if report == last_report:
+                continue # End mark
+            if last_report is not None:
+                yield last_report, time - last_time
+            last_report, last_time = report, time
+        if last_report is not None:
+            yield last_report, end_time - last_time
+
+    def play(self, write: Callable[[bytes], object], start: float | None = None) -> PlaybackStats:
+        """Replay the recording over the serial link with its original timing."""
+        cache = FrameCache()
+        return Player(write, encode=cache.encode_report).play(self.segments(), start)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> "Recording":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,234 @@
+from typing import NamedTuple, final
+from collections.abc import Callable, Sequence
+import queue
+import threading
+import time
+
+from stats import Histogram
+from frame_cache import FrameCache
+from instrument import Instrumentation
+
+@final
+class LatestSlot:
+    """
+    Bounded queue of size one between a producer and a consumer thread.
+    A put() replaces any item that has not been taken yet, so the consumer always gets the latest value.
+    """
+    __slots__ = ("_condition", "_item", "_full", "_closed")
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._item = None
+        self._full = False
+        self._closed = False
+
+    def put(self, item) -> bool:
+        """Store the item and return True if it replaced one that was never taken."""
+        with self._condition:
+            replaced = self._full
+            self._item = item
+            self._full = True
+            self._condition.notify()
+            return replaced
+
+    def get(self, timeout: float | None = None):
+        """Take the latest item, or return None on timeout or after close()."""
+        with self._condition:
+            if not self._full and not self._closed:
+                self._condition.wait(timeout)
+            if not self._full:
+                return None
+            item = self._item
+            self._item = None
+            self._full = False
+            return item
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+class RelayStats(NamedTuple):
+    reads: int      # Reports read from the source
+    changes: int    # Reports that differed from the previous one
+    superseded: int # Changes replaced by a newer report before being written
+    frames: int     # Frames written
+    record_errors: int # Changes that record() raised an exception for
+    latency: Histogram # Write completion time - read time
+
+    def __str__(self) -> str:
+        return (
+            f"reads={self.reads} changes={self.changes} superseded={self.superseded} "
+            f"frames={self.frames} record_errors={self.record_errors} latency({self.latency})"
+        )
+
+class Relay:
+    """
+    Forward HID reports from a device to the serial link.
+
+    A reader thread blocks in read() (which should return an empty report on timeout, e.g.
+    lambda: device.read(64, 10) with hidapi) and passes changed reports through a LatestSlot
+    to a writer thread, which encodes and writes them. When the link falls behind,
+    stale reports are dropped instead of queued, so the input lag stays bounded.
+    Changed reports are also passed to record(report, read_time) if given, e.g. Recorder.record.
+    It runs on a thread of its own, so that its file I/O stays out of the input path,
+    and its exceptions are counted in record_errors instead of stopping the relay.
+    With an Instrumentation, the frame and write stages, counters and a per-frame trace are recorded.
+    An exception from read(), write() or encode() stops the relay and is raised again by stop() and run().
+    """
+
+    def __init__(self,
+        read: Callable[[], Sequence[int]],
+        write: Callable[[bytes], object],
+        encode: Callable[[bytes], bytes] | None = None,
+        timeout: float = 0.01,
+        clock: Callable[[], float] = time.perf_counter,
+        record: Callable[[bytes, float], object] | None = None,
+        instrument: Instrumentation | None = None,
+    ) -> None:
+        self._read = read
+        self._write = write
+        self.cache = FrameCache() if encode is None else None
+        self._encode = encode or self.cache.encode_report
+        self._timeout = timeout
+        self._clock = clock
+        self._record = record
+        self._instrument = instrument
+        self._slot = LatestSlot()
+        # Unlike the slot, every change is kept for the recording
+        self._records: queue.SimpleQueue[tuple[bytes, float] | None] | None = (
+            None if record is None else queue.SimpleQueue()
+        )
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._error: Exception | None = None
+        self._reads = self._changes = self._superseded = self._frames = self._record_errors = 0
+        self._latency = Histogram()
+
+    @property
+    def stats(self) -> RelayStats:
+        return RelayStats(
+            self._reads, self._changes, self._superseded, self._frames, self._record_errors, self._latency
+        )
+
+    def start(self) -> None:
+        if self._threads:
+            raise RuntimeError("relay already started")
+        self._threads = [
+            threading.Thread(target=self._guard, args=(self._reader,), name="relay-reader", daemon=True),
+            threading.Thread(target=self._guard, args=(self._writer,), name="relay-writer", daemon=True),
+        ]
+        if self._records is not None:
+            self._threads.append(threading.Thread(target=self._recorder, name="relay-recorder", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the threads after the pending report (if any) has been written and the changes recorded.
+        Raises the exception that stopped the relay, if any.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def run(self, seconds: float) -> RelayStats:
+        self.start()
+        try:
+            self._stop.wait(seconds)
+        finally:
+            self.stop()
+        return self.stats
+
+    def __enter__(self) -> "Relay":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _guard(self, target: Callable[[], None]) -> None:
+        try:
+            target()
+        except Exception as e:
+            # The first error is the cause, e.g. an unplugged device or serial port
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _reader(self) -> None:
+        read = self._read
+        clock = self._clock
+        records = self._records
+        slot = self._slot
+        last = None
+        try:
+            while not self._stop.is_set():
+                report = read()
+                if not report:
+                    continue
+                read_time = clock()
+                self._reads += 1
+                data = bytes(report)
+                if data == last:
+                    continue
+                last = data
+                self._changes += 1
+                if slot.put((read_time, data)):
+                    self._superseded += 1
+                if records is not None:
+                    records.put((data, read_time))
+        finally:
+            slot.close()
+            if records is not None:
+                records.put(None)
+
+    def _recorder(self) -> None:
+        record = self._record
+        records = self._records
+        while (item := records.get()) is not None:
+            try:
+                record(*item)
+            except Exception:
+                self._record_errors += 1
+
+    def _writer(self) -> None:
+        write = self._write
+        encode = self._encode
+        clock = self._clock
+        slot = self._slot
+        latency = self._latency
+        instrument = self._instrument
+        while True:
+            item = slot.get(self._timeout)
+            if item is None:
+                # The reader closes the slot on exit, after its last put()
+                if slot.closed:
+                    break
+                continue
+            read_time, data = item
+            if instrument is None:
+                write(encode(data))
+            else:
+                start = clock()
+                data = encode(data)
+                middle = clock()
+                write(data)
+                instrument.time("frame", middle - start)
+                instrument.time("write", clock() - middle)
+            self._frames += 1
+            write_time = clock()
+            latency.add(write_time - read_time)
+            if instrument is not None:
+                instrument.count("frames")
+                instrument.count("bytes", len(data))
+                if write_time - read_time > instrument.late_threshold:
+                    instrument.count("late_frames")
+                instrument.record("relay", write_time, write_time - read_time, len(data))
@@ -0,0 +1,197 @@
+from typing import NamedTuple, final
+from collections import deque
+from collections.abc import Iterable
+import math
+
+from model import Gamepad
+from codec import cobsr, crc8
+from stats import Histogram
+from player import Player
+from link import BAUD, REPORT_SIZE, wire_time
+from bytecode.opcode import NEUTRAL_REPORT
+
+# See leonardo_for_nintendo_switch.ino
+READ_BUF_SIZE = 16
+READ_TIMEOUT = 10 # ms
+
+class ConsoleReport(NamedTuple):
+    time: float
+    report: bytes
+
+@final
+class SimulatorStats:
+    __slots__ = (
+        "frames_written", "frames_seen", "packets", "crc_errors", "overflows", "timeouts",
+        "polls", "latency", "busy_time",
+    )
+
+    def __init__(self) -> None:
+        self.frames_written = 0 # write() calls
+        self.frames_seen = 0    # Written frames that reached the console at least once
+        self.packets = 0        # Packets that passed the CRC check
+        self.crc_errors = 0
+        self.overflows = 0      # Bytes dropped by read buffer overflow
+        self.timeouts = 0       # Partial packets discarded by READ_TIMEOUT
+        self.polls = 0
+        self.latency = Histogram(1e-4, 1.0) # From write() to the first poll that delivered the frame
+        self.busy_time = 0.0    # Time the serial line was transmitting
+
+    @property
+    def frames_lost(self) -> int:
+        return self.frames_written - self.frames_seen
+
+    def __str__(self) -> str:
+        return (
+            f"written={self.frames_written} seen={self.frames_seen} lost={self.frames_lost} "
+            f"packets={self.packets} crc_errors={self.crc_errors} overflows={self.overflows} "
+            f"timeouts={self.timeouts} polls={self.polls} latency({self.latency})"
+        )
+
+@final
+class FirmwareSimulator:
+    """
+    Model of the receive loop in leonardo_for_nintendo_switch.ino driven by a virtual clock.
+
+    Bytes written by the host are delivered one by one at the baud rate (8N1).
+    The firmware collects them in a 16-byte buffer, drops the packet on overflow or after
+    READ_TIMEOUT ms without a byte, decodes COBS/R, checks the CRC and swaps the front and
+    back buffers. The console polls the IN endpoint every poll_interval; right after each
+    poll, horipad.ready() becomes true and the next loop() loads the current front buffer,
+    so the console receives it at the following poll.
+    """
+
+    def __init__(self,
+        baud: int = BAUD,
+        poll_interval: float = 0.008,
+        changes_only: bool = True,
+    ) -> None:
+        self._byte_time = wire_time(1, baud)
+        self._poll_interval = poll_interval
+        self._changes_only = changes_only
+        self.reports: list[ConsoleReport] = []
+        self.stats = SimulatorStats()
+        self.time = 0.0
+
+        # Serial line: (arrival time, byte, frame id)
+        self._line: deque[tuple[float, int, int]] = deque()
+        self._line_free_time = 0.0
+        self._write_times: deque[tuple[int, float]] = deque() # Frames not delivered yet
+
+        # Firmware state
+        self._read_buf = bytearray(READ_BUF_SIZE)
+        self._read_bytes = 0
+        self._last_read_millis = 0
+        self._front_buf = bytearray(NEUTRAL_REPORT.ljust(READ_BUF_SIZE, b"\x00"))
+        self._back_buf = bytearray(NEUTRAL_REPORT.ljust(READ_BUF_SIZE, b"\x00"))
+        self._front_id = -1
+
+        # IN endpoint: loaded at time 0 by the first loop()
+        self._endpoint = bytes(self._front_buf[:REPORT_SIZE])
+        self._endpoint_id = -1
+        self._next_poll = 0.0
+        self._last_report = b""
+
+    def write(self, time: float, data: bytes) -> None:
+        """Host writes data at the given time (non-decreasing). Each call counts as one frame."""
+        self.advance(time)
+        frame_id = self.stats.frames_written
+        self.stats.frames_written += 1
+        self._write_times.append((frame_id, time))
+        start = max(time, self._line_free_time)
+        for i, byte in enumerate(data, start = 1):
+            self._line.append((start + i * self._byte_time, byte, frame_id))
+        self._line_free_time = start + len(data) * self._byte_time
+        self.stats.busy_time += len(data) * self._byte_time
+
+    def advance(self, time: float) -> None:
+        """Run the firmware and the console polls up to the given time."""
+        line = self._line
+        while True:
+            byte_time = line[0][0] if line else math.inf
+            if self._next_poll <= byte_time and self._next_poll <= time:
+                self._poll(self._next_poll)
+                self._next_poll += self._poll_interval
+            elif byte_time <= time:
+                self._receive(*line.popleft())
+            else:
+                break
+        self.time = max(self.time, time)
+
+    def flush(self) -> None:
+        """Run until every written byte has been received and delivered to the console."""
+        self.advance(max(self.time, self._line_free_time) + 2 * self._poll_interval)
+
+    def _poll(self, time: float) -> None:
+        stats = self.stats
+        stats.polls += 1
+        report = self._endpoint
+        if not self._changes_only or report != self._last_report:
+            self.reports.append(ConsoleReport(time, report))
+            self._last_report = report
+        # Frames are delivered in write order, so earlier ones that are still pending were lost
+        write_times = self._write_times
+        while write_times and write_times[0][0] < self._endpoint_id:
+            write_times.popleft()
+        if write_times and write_times[0][0] == self._endpoint_id:
+            stats.frames_seen += 1
+            stats.latency.add(time - write_times.popleft()[1])
+        # horipad.ready() -> SendReport(front_buf, 8)
+        self._endpoint = bytes(self._front_buf[:REPORT_SIZE])
+        self._endpoint_id = self._front_id
+
+    def _receive(self, time: float, byte: int, frame_id: int) -> None:
+        stats = self.stats
+        crnt_millis = int(time * 1000)
+        if self._read_bytes != 0 and crnt_millis - self._last_read_millis >= READ_TIMEOUT:
+            self._read_bytes = 0
+            stats.timeouts += 1
+
+        if byte != 0:
+            if self._read_bytes != READ_BUF_SIZE:
+                self._read_buf[self._read_bytes] = byte
+                self._read_bytes += 1
+                self._last_read_millis = crnt_millis
+            else:
+                # read buffer overflow
+                self._read_bytes = 0
+                stats.overflows += 1
+        elif self._read_bytes != 0:
+            data = cobsr.decode(bytes(self._read_buf[:self._read_bytes]))
+            self._back_buf[:len(data)] = data
+            if not crc8.ccitt(data):
+                self._front_buf, self._back_buf = self._back_buf, self._front_buf
+                self._front_id = frame_id
+                stats.packets += 1
+            else:
+                # Invalid packet data
+                stats.crc_errors += 1
+            self._read_bytes = 0
+
+@final
+class VirtualClock:
+    """A clock for Player that only advances when sleeping."""
+    __slots__ = ("time",)
+
+    def __init__(self, time: float = 0.0) -> None:
+        self.time = time
+
+    def __call__(self) -> float:
+        return self.time
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.time += seconds
+
+def simulate(
+    segments: Iterable[tuple[Gamepad, float]],
+    baud: int = BAUD,
+    poll_interval: float = 0.008,
+    changes_only: bool = True,
+) -> FirmwareSimulator:
+    """Play segments (e.g. from _MacroBuilder.run()) into a FirmwareSimulator in virtual time."""
+    clock = VirtualClock()
+    simulator = FirmwareSimulator(baud, poll_interval, changes_only)
+    player = Player(lambda data: simulator.write(clock(), data), clock = clock, sleep = clock.sleep, spin_threshold = 0)
+    player.play(segments)
+    simulator.flush()
+    return simulator
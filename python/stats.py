@@ -0,0 +1,51 @@
+from typing import final
+import math
+
+@final
+class Histogram:
+    """
+    Histogram of non-negative durations (in seconds) with fixed-width buckets.
+    Memory use is constant regardless of the number of samples.
+    Values beyond the limit are counted in an overflow bucket; the maximum is always exact.
+    """
+    __slots__ = ("_resolution", "_buckets", "count", "total", "max")
+
+    def __init__(self, resolution: float = 1e-5, limit: float = 0.1) -> None:
+        self._resolution = resolution
+        self._buckets = [0] * (math.ceil(limit / resolution) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        if value < 0:
+            value = 0.0
+        index = int(value / self._resolution)
+        self._buckets[index if index < len(self._buckets) else -1] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Return the upper bound of the bucket containing the p-th percentile (0-100)."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100) or 1
+        seen = 0
+        for index, n in enumerate(self._buckets):
+            seen += n
+            if seen >= rank:
+                return min((index + 1) * self._resolution, self.max)
+        return self.max
+
+    def __str__(self) -> str:
+        return (
+            f"p50={self.percentile(50) * 1000:0.3f}ms "
+            f"p99={self.percentile(99) * 1000:0.3f}ms "
+            f"max={self.max * 1000:0.3f}ms"
+        )
@@ -1,8 +1,7 @@
 import serial
-import time
 
-from macro import Macro, A
-from codec import cobsr, crc8
+from macro import Macro, A, coalesce
+from player import Player
 
 ser = serial.Serial("COM6", 115200)
 # ser.write(b"\x00\x00\x08\x80\x80\x80\x80\x00")
@@ -17,8 +16,7 @@ m = Macro().build(
     (A >> 0.1, 0.1) * 3
 )
 
-for gamepad, duration in m.run():
-    print(gamepad)
-    data = gamepad.to_hid_report()
-    ser.write(cobsr.encode(data + int.to_bytes(crc8.ccitt(data))) + b"\x00")
-    time.sleep(duration)
+player = Player(ser.write)
+stats = player.play(coalesce(m.run()))
+print(stats)
+print(player.cache)
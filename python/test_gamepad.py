@@ -1,9 +1,8 @@
-import time
 import hid # pip install hidapi
 import serial
 
-from model import Gamepad
-from codec import cobsr, crc8
+from relay import Relay
+from recording import Recorder
 
 ser = serial.Serial("COM6", 115200)
 
@@ -18,15 +17,17 @@ try:
     device = hid.device()
     print(f"Opening the {dev_dict["product_string"]}")
     device.open(dev_dict["vendor_id"], dev_dict["product_id"])
-    device.set_nonblocking(1)
 
     seconds = float(input("Enter seconds: "))
-    start = time.perf_counter()
-    while time.perf_counter() - start < seconds:
-        if report := device.read(64):
-            data = bytes(report)
-            print(Gamepad.from_hid_report(data))
-            ser.write(cobsr.encode(data + int.to_bytes(crc8.ccitt(data))) + b"\x00")
+    path = input("Record to file (empty to skip): ")
+    # Blocking reads with a 10 ms timeout, so that the relay can stop
+    if path:
+        with Recorder(path) as recorder:
+            relay = Relay(lambda: device.read(64, 10), ser.write, record=recorder.record)
+            print(relay.run(seconds))
+        print(f"Recorded {recorder.records} reports to {path}")
+    else:
+        print(Relay(lambda: device.read(64, 10), ser.write).run(seconds))
     print(f"Closing the {dev_dict["product_string"]}")
     device.close()
 
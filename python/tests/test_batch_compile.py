@@ -0,0 +1,32 @@
+from batch_compile import compile_library
+from macro import Macro, A, B
+from recording import Recording
+
+_SCRIPT = """
+from macro import Macro, A, B
+def build():
+    return Macro().build(A >> 0.1, 0.1, B >> 1.5, 2.0)
+"""
+
+def _library(tmp_path):
+    source_dir = tmp_path / "macros"
+    source_dir.mkdir()
+    (source_dir / "combo.py").write_text(_SCRIPT)
+    return source_dir
+
+def test_bytecode_matches_compile(tmp_path):
+    source_dir = _library(tmp_path)
+    [result] = compile_library(str(source_dir), str(tmp_path / "out"), jobs = 1)
+    assert result.error is None and not result.skipped
+    with open(result.output, "rb") as file:
+        assert file.read() == Macro().build(A >> 0.1, 0.1, B >> 1.5, 2.0).compile()
+
+    [result] = compile_library(str(source_dir), str(tmp_path / "out"), jobs = 1)
+    assert result.skipped
+
+def test_recording_keeps_the_last_duration(tmp_path):
+    source_dir = _library(tmp_path)
+    [result] = compile_library(str(source_dir), str(tmp_path / "out"), "recording", jobs = 1)
+    with Recording(result.output) as recording:
+        segments = list(recording.segments())
+    assert [round(duration, 6) for _, duration in segments] == [0.1, 0.1, 1.5, 2.0]
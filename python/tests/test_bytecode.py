@@ -0,0 +1,41 @@
+import random
+
+import bytecode
+from bytecode.opcode import TIME_UNIT
+from macro import Macro, Repeat, coalesce, A, B, X, UP, LS
+from model import Vec2
+
+def _macro(rng: random.Random):
+    handles = [A, B, X, UP, LS(Vec2.UP), A + LS(Vec2(0.5, -0.5))]
+    def part():
+        return [(rng.choice(handles) >> rng.choice((0.1, 0.05, 0.016, 0.0004)), rng.choice((0, 0.05, 0.0003))) for _ in range(rng.randint(1, 8))]
+    sequence = []
+    for _ in range(rng.randint(1, 10)):
+        sequence.append(Repeat(part(), rng.randint(0, 20)) if rng.random() < 0.4 else part())
+    m = Macro().build(sequence)
+    if rng.random() < 0.3:
+        m.build(part())
+    return m
+
+def _expected(m) -> list[tuple[bytes, int]]:
+    # Coalesced segments quantized against the accumulated time, as encode_frames() does
+    frames = []
+    elapsed_time = 0
+    emitted_ticks = 0
+    for gamepad, duration in coalesce(m.run()):
+        elapsed_time += duration
+        ticks = round(elapsed_time / TIME_UNIT)
+        if ticks > emitted_ticks:
+            frames.append((gamepad.to_hid_report(), ticks - emitted_ticks))
+            emitted_ticks = ticks
+    return frames
+
+def test_interpret_compiled_macros():
+    for seed in range(200):
+        m = _macro(random.Random(seed))
+        expected = _expected(m)
+        for loop_folding in (False, True):
+            code = m.compile(loop_folding)
+            assert bytecode.validate(code) <= len(expected)
+            actual = [(report, round(delta / TIME_UNIT)) for report, delta in bytecode.interpret(code)]
+            assert actual == expected, (seed, loop_folding)
@@ -0,0 +1,56 @@
+import random
+
+from codec import cobsr
+
+def _reference_encode(data: bytes) -> bytes:
+    """The original byte by byte encoder."""
+    if not data:
+        return b"\x01"
+    buf = bytearray(len(data) + len(data) // 254 + 1)
+    write_index = 1
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte != 0:
+            buf[write_index] = byte
+            write_index += 1
+            code += 1
+            if code == 0xFF:
+                buf[code_index] = code
+                code_index = write_index
+                write_index += 1
+                code = 1
+        else:
+            buf[code_index] = code
+            code_index = write_index
+            write_index += 1
+            code = 1
+    if data[-1] >= code:
+        buf[code_index] = data[-1]
+        write_index -= 1
+    else:
+        buf[code_index] = code
+    return bytes(buf[:write_index])
+
+def _random_data(rng: random.Random) -> bytes:
+    # Mostly zero-free runs around the 254-byte block size, with small or large last bytes
+    size = rng.choice((rng.randrange(16), rng.randrange(240, 770), rng.randrange(2000)))
+    zero_rate = rng.choice((0, 0.001, 0.05, 0.5))
+    return bytes(
+        0 if rng.random() < zero_rate else rng.choice((1, 2, 0xFE, 0xFF, rng.randrange(1, 256)))
+        for _ in range(size)
+    )
+
+def test_encode_matches_reference():
+    rng = random.Random(0)
+    for _ in range(3000):
+        data = _random_data(rng)
+        assert cobsr.encode(data) == _reference_encode(data), data.hex()
+
+def test_round_trip():
+    rng = random.Random(1)
+    for _ in range(3000):
+        data = _random_data(rng)
+        encoded = cobsr.encode(data)
+        assert 0 not in encoded
+        assert cobsr.decode(encoded) == data, data.hex()
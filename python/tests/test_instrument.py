@@ -0,0 +1,23 @@
+from instrument import Instrumentation
+from macro import Macro, A, B
+from player import Player
+
+class _VirtualClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+def test_wait_stage_covers_long_holds():
+    clock = _VirtualClock()
+    instrument = Instrumentation()
+    player = Player(lambda data: None, spin_threshold = 0, clock = clock, sleep = clock.sleep, instrument = instrument)
+    player.play(Macro().build(A >> 1.0, B >> 1.0, A >> 1.0).run(), start = 0.0)
+    wait = instrument.stages["wait"]
+    assert wait.count == 5 # Before each of the 4 segments and after the last one
+    assert abs(wait.percentile(50) - 1.0) <= 0.001
+    assert abs(wait.percentile(99) - 1.0) <= 0.001
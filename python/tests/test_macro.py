@@ -0,0 +1,180 @@
+import itertools
+import random
+
+import pytest
+
+from macro import Macro, Repeat, InputHandle, BeginEvent, TimedEvent, flatten, A, B, X, Y, ZR, UP, LEFT, LS, RS
+from model import Gamepad, Button, Vec2
+
+def _frames(segments) -> list[tuple[bytes, float]]:
+    return [(gamepad.to_hid_report(), duration) for gamepad, duration in segments]
+
+class _Reference:
+    """The original eager implementation: one sorted event list, every modifier reapplied per segment."""
+
+    def __init__(self) -> None:
+        self.events: list[TimedEvent] = []
+        self.total_time = 0
+
+    def build(self, *input_sequence) -> "_Reference":
+        events = []
+        elapsed_time = 0
+        for obj in flatten(input_sequence):
+            if isinstance(obj, (float, int)):
+                elapsed_time += obj
+            else:
+                events.append(TimedEvent(elapsed_time, obj))
+        if self.total_time > 0:
+            self.events.extend(events)
+            self.events.sort(key = lambda timed_event: timed_event.time)
+            self.total_time = max(self.total_time, elapsed_time)
+        else:
+            self.events = events
+            self.total_time = elapsed_time
+        return self
+
+    def __add__(self, other: "_Reference") -> "_Reference":
+        result = _Reference()
+        result.events = [*self.events, *(TimedEvent(time + self.total_time, event) for time, event in other.events)]
+        result.total_time = self.total_time + other.total_time
+        return result
+
+    def run(self):
+        modifiers = []
+        gamepad = Gamepad()
+        start_time = 0
+        for time, event in self.events:
+            if start_time != time:
+                for modifier in modifiers:
+                    modifier(gamepad)
+                yield gamepad, time - start_time
+                start_time = time
+                gamepad.reset()
+            if type(event) is BeginEvent:
+                modifiers.append(event.modifier)
+            else:
+                modifiers.remove(event.modifier)
+        for modifier in modifiers:
+            modifier(gamepad)
+        yield gamepad, self.total_time - start_time
+
+def _press_right_stick_and_y(gamepad: Gamepad) -> None:
+    # Not one of the known modifiers, so the state falls back to replaying every modifier
+    gamepad.right_stick = Vec2.RIGHT
+    gamepad.buttons |= Button.Y
+
+def _sequence(rng: random.Random, events: int) -> list:
+    handles = [
+        A, B, ZR, UP, LEFT, LS(Vec2.UP), LS(Vec2(0.3, 0.3)), RS(Vec2.LEFT.rotate(30)),
+        InputHandle(_press_right_stick_and_y), A + UP, B + LS(Vec2.DOWN),
+    ]
+    sequence = []
+    for _ in range(events):
+        sequence.append(rng.choice(handles) >> rng.choice((0.1, 0.05, 0.2, 0.016)))
+        if rng.random() < 0.5:
+            sequence.append(rng.choice((0.1, 0.05, 0.01, 0)))
+    return sequence
+
+def _compose(macro, rng: random.Random):
+    """Build, overlay and concatenate random parts, the same way for Macro() and _Reference()."""
+    m = macro().build(_sequence(rng, rng.randint(0, 40)))
+    for _ in range(rng.randint(0, 3)):
+        m.build(_sequence(rng, rng.randint(1, 30)))
+    for _ in range(rng.randint(0, 4)):
+        other = macro().build(_sequence(rng, rng.randint(1, 20)))
+        if rng.random() < 0.5:
+            other.build(_sequence(rng, rng.randint(1, 20)))
+        m = m + other if rng.random() < 0.5 else other + m
+        if rng.random() < 0.3:
+            m.build(_sequence(rng, rng.randint(1, 30)))
+    return m
+
+def test_run_matches_reference():
+    for seed in range(300):
+        expected = _frames(_compose(_Reference, random.Random(seed)).run())
+        assert _frames(_compose(Macro, random.Random(seed)).run()) == expected, seed
+
+def test_deep_composition_with_overlays_matches_flat_build():
+    # Library pattern: prepend a part, then overlay a press on the whole macro.
+    # Durations are binary fractions, so the shifted times are exact.
+    handles = [B, Y, UP, LS(Vec2.UP)]
+    m = Macro().build(A >> 0.5)
+    presses = [(0.0, 0.5, A)]
+    for i in range(1000):
+        m = Macro().build(X >> 0.25, 0.25) + m
+        presses = [(0.0, 0.25, X)] + [(time + 0.5, duration, handle) for time, duration, handle in presses]
+        m.build(i % 4 * 0.125, handles[i % 4] >> 0.125)
+        presses.append((i % 4 * 0.125, 0.125, handles[i % 4]))
+
+    flat = Macro()
+    for time, duration, handle in presses:
+        flat.build(time, handle >> duration)
+
+    assert _frames(m.run()) == _frames(flat.run())
+    assert _frames(m.run(start = 123.375)) == _frames(flat.run(start = 123.375))
+
+def test_ticks_leave_out_an_empty_last_segment():
+    dropped = []
+    m = Macro(tick = 0.01).build(A >> 0.1, 0.003)
+    segments = [(gamepad.to_hid_report(), duration) for gamepad, duration in m.run(dropped)]
+    assert segments == [(Gamepad(Button.A).to_hid_report(), 0.1)]
+    assert [(round(d.time, 9), round(d.duration, 9)) for d in dropped] == [(0.1, 0.003)]
+
+def _sequence_with_repeats(rng: random.Random, events: int) -> list:
+    sequence = _sequence(rng, events)
+    for _ in range(rng.randint(0, 3)):
+        repeat = Repeat(_sequence(rng, rng.randint(0, 5)), rng.randint(0, 4))
+        sequence.insert(rng.randint(0, len(sequence)), repeat)
+    return sequence
+
+def test_stream_matches_build():
+    for seed in range(100):
+        rng = random.Random(seed)
+        tick = rng.choice((None, 0.01))
+        sequence = _sequence_with_repeats(rng, rng.randint(0, 30))
+        expected = _frames(Macro(tick = tick).build(sequence).run())
+        assert _frames(Macro(tick = tick).stream(sequence)) == expected, seed
+
+        # Merged with the overlays already built, without modifying the builder
+        m = Macro(tick = tick).build(_sequence_with_repeats(rng, rng.randint(1, 20)))
+        m.build(_sequence_with_repeats(rng, rng.randint(1, 20)))
+        before = _frames(m.run())
+        streamed = _frames(m.stream(sequence))
+        assert _frames(m.run()) == before, seed
+        assert streamed == _frames(m.build(sequence).run()), seed
+
+def test_stream_consumes_an_endless_generator_lazily():
+    consumed = 0
+    def endless():
+        nonlocal consumed
+        while True:
+            consumed += 1
+            yield A >> 0.125, 0.125
+
+    segments = _frames(itertools.islice(Macro().stream(endless()), 6))
+    assert segments == [(Gamepad(Button.A).to_hid_report(), 0.125), (Gamepad().to_hid_report(), 0.125)] * 3
+    assert consumed <= 5
+
+def test_repeat_matches_tuple_multiplication():
+    # Durations are binary fractions, so the repeated times are exact
+    rng = random.Random(0)
+    handles = [A, B, UP, LS(Vec2.UP), A + UP]
+    for count in range(5):
+        sequence = tuple(
+            item for _ in range(5)
+            for item in (rng.choice(handles) >> rng.choice((0.125, 0.0625, 0.25)), rng.choice((0, 0.03125)))
+        )
+        for tick in (None, 0.01):
+            expected = _frames(Macro(tick = tick).build(A >> 0.1, sequence * count, 0.05).run())
+            assert _frames(Macro(tick = tick).build(A >> 0.1, Repeat(sequence, count), 0.05).run()) == expected
+            # InputHandle * count with the default duration
+            assert _frames(Macro(0.05, tick = tick).build(A, B * count, 0.05).run()) == _frames(
+                Macro(0.05, tick = tick).build(A, (B,) * count, 0.05).run()
+            )
+
+def test_repeat_count_is_validated():
+    for count in (2.5, 2.0, "2", None):
+        with pytest.raises(ValueError, match = "integer"):
+            Repeat((A >> 0.1,), count)
+    with pytest.raises(ValueError, match = "negative"):
+        Repeat((A >> 0.1,), -1)
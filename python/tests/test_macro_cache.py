@@ -0,0 +1,19 @@
+import macro_cache
+from macro import Macro, A, B
+from macro_cache import MacroCache
+
+def _build(count: int):
+    return Macro().build((A >> 0.1, 0.1, B >> 0.05) * count)
+
+def test_hit_returns_the_compiled_macro(tmp_path):
+    cache = MacroCache(str(tmp_path))
+    assert bytes(cache.compile(_build, 3)) == _build(3).compile()
+    assert bytes(cache.compile(_build, 3)) == _build(3).compile()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_toolchain_change_invalidates_entries(tmp_path, monkeypatch):
+    cache = MacroCache(str(tmp_path))
+    cache.compile(_build, 3)
+    monkeypatch.setattr(macro_cache, "toolchain_hash", lambda: "changed compiler")
+    cache.compile(_build, 3)
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,54 @@
+import math
+import random
+
+import numpy as np
+
+from model import Gamepad, Button, HatSwitch, Vec2
+from model.batch import GamepadBatch
+from model.stick import NEUTRAL, encode_stick, decode_stick, polar
+
+def _random_gamepad(rng: random.Random) -> Gamepad:
+    def stick() -> Vec2:
+        return rng.choice((Vec2.ZERO, Vec2.UP, polar(rng.randrange(360)), Vec2(rng.uniform(-1.5, 1.5), rng.uniform(-1.5, 1.5))))
+    return Gamepad(Button(rng.getrandbits(14)), HatSwitch(rng.getrandbits(4)), stick(), stick())
+
+def test_stick_round_trip():
+    rng = random.Random(0)
+    for _ in range(5000):
+        gamepad = _random_gamepad(rng)
+        report = gamepad.to_hid_report()
+        assert report[3:7] == bytes((*encode_stick(gamepad.left_stick), *encode_stick(gamepad.right_stick)))
+        decoded = Gamepad.from_hid_report(report)
+        assert decoded.to_hid_report() == report
+        assert decoded.left_stick is decode_stick(report[3], report[4])
+        assert decoded.right_stick is decode_stick(report[5], report[6])
+
+def test_decode_stick_of_every_byte():
+    for x in range(256):
+        for y in range(0, 256, 5):
+            pos = decode_stick(x, y)
+            if math.hypot(pos.x, pos.y) <= 1:
+                assert encode_stick(pos) == (x, y)
+    assert decode_stick(NEUTRAL, NEUTRAL) == Vec2.ZERO
+
+def test_batch_round_trip():
+    rng = random.Random(1)
+    gamepads = [_random_gamepad(rng) for _ in range(500)]
+    reports = b"".join(gamepad.to_hid_report() for gamepad in gamepads)
+    batch = GamepadBatch.from_gamepads(gamepads)
+    assert batch.to_reports().tobytes() == reports
+    assert GamepadBatch.from_reports(reports).to_reports().tobytes() == reports
+    assert [gamepad.to_hid_report() for gamepad in batch] == [gamepad.to_hid_report() for gamepad in gamepads]
+    assert batch[7].to_hid_report() == gamepads[7].to_hid_report()
+
+def test_batch_stick_values():
+    batch = GamepadBatch.neutral(3)
+    assert not batch.stick_values().any()
+    batch.sticks[1] = (0x00, 0xff, 0x81, 0x7f)
+    values = batch.stick_values()
+    assert values.dtype == np.float32
+    assert values[1].tolist() == np.array([-1, 1, 3 / 255, -1 / 255], dtype = np.float32).tolist()
+    # The values encode back to the same bytes
+    for byte in range(256):
+        batch.sticks[0] = byte
+        assert encode_stick(Vec2(float(batch.stick_values()[0, 0]), 0))[0] == byte
@@ -0,0 +1,85 @@
+import os
+import select
+import time
+
+import pytest
+
+from codec import frame
+from macro import Macro, A, B
+from orchestrator import Orchestrator
+
+pty = pytest.importorskip("pty")
+tty = pytest.importorskip("tty")
+
+def _macro():
+    return Macro().build((A >> 0.02, 0.02, B >> 0.01) * 3)
+
+class _PtyPort:
+    """A pseudo terminal pair standing in for a serial port. The orchestrator writes the master side."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.first_write: float | None = None
+
+    def write(self, data: bytes) -> None:
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        os.write(self.master, data)
+
+    def read_reports(self) -> list[bytes]:
+        data = b""
+        while select.select([self.slave], [], [], 0.1)[0]:
+            data += os.read(self.slave, 4096)
+        return frame.decode_stream(data)
+
+    def close(self) -> None:
+        os.close(self.master)
+        os.close(self.slave)
+
+@pytest.fixture
+def ports():
+    ports = [_PtyPort(f"port{n}") for n in range(3)]
+    yield ports
+    for port in ports:
+        port.close()
+
+def test_ports_start_together(ports):
+    expected = [gamepad.to_hid_report() for gamepad, _ in _macro().run()]
+    orchestrator = Orchestrator(start_delay = 0.1)
+    for port in ports:
+        orchestrator.add(port.name, port.write, _macro().run())
+    results = orchestrator.run()
+
+    assert [result.name for result in results] == [port.name for port in ports]
+    for port, result in zip(ports, results):
+        assert result.error is None and result.write_errors == 0
+        assert result.stats.frames == len(expected)
+        assert port.read_reports() == expected
+    first_writes = [port.first_write for port in ports]
+    assert max(first_writes) - min(first_writes) < 0.02
+
+def test_failing_port_does_not_stall_the_others(ports):
+    attempts = 0
+    def unplugged(data: bytes) -> None:
+        nonlocal attempts
+        attempts += 1
+        raise OSError("device unplugged")
+
+    expected = [gamepad.to_hid_report() for gamepad, _ in _macro().run()]
+    orchestrator = Orchestrator(start_delay = 0.1, max_errors = 2)
+    orchestrator.add("unplugged", unplugged, _macro().run())
+    for port in ports:
+        orchestrator.add(port.name, port.write, _macro().run())
+    start = time.perf_counter()
+    failed, *results = orchestrator.run()
+    elapsed_time = time.perf_counter() - start
+
+    assert isinstance(failed.error, OSError)
+    assert failed.write_errors == attempts == 3 # Stops after more than max_errors in a row
+    for port, result in zip(ports, results):
+        assert result.error is None
+        assert port.read_reports() == expected
+    # The macro lasts 0.15 s after the start delay
+    assert elapsed_time < 0.5
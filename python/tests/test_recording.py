@@ -0,0 +1,71 @@
+from recording import Recorder, Recording, MAGIC, KEYFRAME, REPORT_SIZE
+
+NEUTRAL = bytes((0x00, 0x00, 0x08, 0x80, 0x80, 0x80, 0x80, 0x00))
+
+def _with(report: bytes, **bytes_by_index: int) -> bytes:
+    report = bytearray(report)
+    for name, value in bytes_by_index.items():
+        report[int(name[1:])] = value
+    return bytes(report)
+
+def _record(path, reports: list[tuple[float, bytes]], end: float | None, keyframe_interval: float = 1.0) -> None:
+    recorder = Recorder(str(path), keyframe_interval = keyframe_interval, clock = lambda: 0.0)
+    for time, report in reports:
+        recorder.record(report, time)
+    if end is not None:
+        recorder.close(end)
+    else:
+        # Interrupted: closed without the end mark
+        recorder._file.close()
+
+def _masks(path) -> list[int]:
+    """The masks of the records of a recording file, end mark included."""
+    data = path.read_bytes()[len(MAGIC):]
+    masks = []
+    offset = 0
+    while offset < len(data):
+        while data[offset] & 0x80:
+            offset += 1
+        mask = data[offset + 1]
+        masks.append(mask)
+        offset += 2 + (REPORT_SIZE if mask == KEYFRAME else mask.bit_count())
+    return masks
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "session.rec"
+    reports = [
+        (10.0, NEUTRAL),
+        (10.1, _with(NEUTRAL, b0 = 0x04)),
+        (10.1, _with(NEUTRAL, b0 = 0x04)), # Unchanged
+        (10.25, _with(NEUTRAL, b0 = 0x04, b3 = 0xff)),
+        (10.5, NEUTRAL),
+    ]
+    _record(path, reports, 11.0)
+    assert _masks(path) == [KEYFRAME, 0x01, 0x08, 0x09, 0x00]
+    with Recording(str(path)) as recording:
+        segments = list(recording.segments())
+    assert [report for report, _ in segments] == [report for _, report in reports[:2] + reports[3:]]
+    assert [round(duration, 6) for _, duration in segments] == [0.1, 0.15, 0.25, 0.5]
+
+def test_keyframe_interval(tmp_path):
+    path = tmp_path / "session.rec"
+    reports = [(n * 0.3, _with(NEUTRAL, b0 = n)) for n in range(8)]
+    _record(path, reports, 2.4, keyframe_interval = 1.0)
+    # Keyframes at 0 and 1.2 s, then the end mark
+    assert _masks(path) == [KEYFRAME, 1, 1, 1, KEYFRAME, 1, 1, 1, 0]
+    with Recording(str(path)) as recording:
+        assert [report for report, _ in recording.segments()] == [report for _, report in reports]
+
+def test_truncated_last_record(tmp_path):
+    path = tmp_path / "session.rec"
+    reports = [(0.0, NEUTRAL), (0.1, _with(NEUTRAL, b0 = 0x04)), (0.3, _with(NEUTRAL, b0 = 0x04, b3 = 0xff))]
+    _record(path, reports, None)
+    data = path.read_bytes()
+    # Cut off inside the changed bytes, after the mask and after the delta time of the last record
+    for size in (len(data) - 1, len(data) - 2, len(data) - 3):
+        path.write_bytes(data[:size])
+        with Recording(str(path)) as recording:
+            segments = list(recording.segments())
+        assert [report for report, _ in segments] == [reports[0][1], reports[1][1]]
+        # Interrupted before the end mark: the last report has no duration
+        assert [round(duration, 6) for _, duration in segments] == [0.1, 0.0]
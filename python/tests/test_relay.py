@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from relay import Relay, LatestSlot
+
+class _Source:
+    """Stand-in for a HID device: read() returns queued reports, or an empty report on timeout."""
+
+    def __init__(self) -> None:
+        self.reports: queue.Queue[bytes] = queue.Queue()
+
+    def read(self) -> bytes:
+        try:
+            return self.reports.get(timeout = 0.005)
+        except queue.Empty:
+            return b""
+
+def _wait_for(condition) -> None:
+    deadline = time.monotonic() + 1
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def _feed(relay: Relay, source: _Source, reports: list[bytes]) -> None:
+    """Pass the reports one at a time, each after the previous change has been written."""
+    for report in reports:
+        reads = relay.stats.reads
+        source.reports.put(report)
+        _wait_for(lambda: relay.stats.reads > reads and relay.stats.frames == relay.stats.changes)
+
+def _report(n: int) -> bytes:
+    return bytes((n & 0xFF, 0, 0x0F, 0x80, 0x80, 0x80, 0x80, 0))
+
+def test_only_changes_are_written():
+    source = _Source()
+    written = []
+    with Relay(source.read, written.append, encode = bytes) as relay:
+        _feed(relay, source, [_report(n) for n in (1, 1, 2, 2, 2, 1, 3, 3)])
+    stats = relay.stats
+    assert (stats.reads, stats.changes, stats.superseded) == (8, 4, 0)
+    assert written == [_report(n) for n in (1, 2, 1, 3)]
+
+def test_stale_reports_are_superseded():
+    source = _Source()
+    written = []
+    gate = threading.Event()
+    def write(data: bytes) -> None:
+        gate.wait() # A link that falls behind
+        written.append(data)
+
+    with Relay(source.read, write, encode = bytes) as relay:
+        for n in range(100):
+            source.reports.put(_report(n))
+        _wait_for(lambda: relay.stats.reads == 100)
+        gate.set()
+    stats = relay.stats
+    assert stats.changes == 100
+    assert stats.superseded > 90
+    assert stats.frames + stats.superseded == stats.changes
+    # Only the latest report is pending when the link catches up
+    assert written[-1] == _report(99)
+
+def test_stop_joins_the_threads_and_records_every_change():
+    source = _Source()
+    recorded = []
+    def record(report: bytes, read_time: float) -> None:
+        if len(report) != 8:
+            raise ValueError("not a report")
+        recorded.append(report)
+
+    relay = Relay(source.read, lambda data: None, encode = bytes, record = record)
+    relay.start()
+    _feed(relay, source, [_report(1), bytes(64), _report(2)])
+    relay.stop()
+    assert not any(thread.is_alive() for thread in threading.enumerate() if thread.name.startswith("relay-"))
+    assert recorded == [_report(1), _report(2)]
+    assert relay.stats.record_errors == 1
+    assert relay.stats.frames == 3
+
+def test_latest_slot():
+    slot = LatestSlot()
+    assert not slot.put(1)
+    assert slot.put(2)
+    assert slot.get(0) == 2
+    assert slot.get(0) is None
+    slot.close()
+    assert slot.closed and slot.get() is None
+
+def test_read_error_stops_the_relay():
+    reads = 0
+    def read() -> bytes:
+        nonlocal reads
+        reads += 1
+        if reads > 5:
+            raise OSError("device unplugged")
+        return _report(reads)
+
+    relay = Relay(read, lambda data: None, encode = bytes)
+    start = time.monotonic()
+    with pytest.raises(OSError, match = "unplugged"):
+        relay.run(2.0)
+    assert time.monotonic() - start < 1
+    assert relay.stats.reads == 5
+
+def test_write_error_stops_the_relay():
+    source = _Source()
+    def write(data: bytes) -> None:
+        raise OSError("serial port closed")
+
+    relay = Relay(source.read, write, encode = bytes)
+    source.reports.put(_report(1))
+    start = time.monotonic()
+    with pytest.raises(OSError, match = "serial port closed"):
+        relay.run(2.0)
+    assert time.monotonic() - start < 1
+    assert relay.stats.frames == 0
@@ -0,0 +1,81 @@
+import pytest
+
+from codec import cobsr, crc8, frame
+from bytecode.opcode import NEUTRAL_REPORT
+from link import wire_time
+from model import Gamepad
+from simulator import FirmwareSimulator, READ_BUF_SIZE, READ_TIMEOUT, simulate
+
+PRESSED = b"\x04" + NEUTRAL_REPORT[1:]
+
+def _reports(simulator: FirmwareSimulator) -> list[bytes]:
+    return [report for _, report in simulator.reports]
+
+def test_poll_latency():
+    simulator = FirmwareSimulator(poll_interval = 0.008)
+    data = frame.encode(PRESSED)
+    simulator.write(0.001, data)
+    simulator.flush()
+    # Received at about 2 ms, loaded into the endpoint at the 8 ms poll and delivered at the next one
+    assert 0.001 + wire_time(len(data)) < 0.008
+    assert simulator.reports[1:] == [(0.016, PRESSED)]
+    assert simulator.reports[0].report == NEUTRAL_REPORT
+    stats = simulator.stats
+    assert (stats.frames_written, stats.frames_seen, stats.packets) == (1, 1, 1)
+    assert stats.latency.max == pytest.approx(0.015, abs = 1e-4)
+
+def test_crc_reject():
+    simulator = FirmwareSimulator()
+    crc = crc8.ccitt(PRESSED)
+    simulator.write(0.0, cobsr.encode(PRESSED + bytes((crc ^ 0x01,))) + b"\x00")
+    simulator.flush()
+    assert _reports(simulator) == [NEUTRAL_REPORT]
+    assert (simulator.stats.crc_errors, simulator.stats.packets, simulator.stats.frames_lost) == (1, 0, 1)
+
+def test_overflow_drop():
+    simulator = FirmwareSimulator()
+    # The last byte overflows the read buffer and the packet is dropped, but the next one is received
+    simulator.write(0.0, b"\x01" * (READ_BUF_SIZE + 1))
+    simulator.write(0.0, frame.encode(PRESSED))
+    simulator.flush()
+    assert _reports(simulator) == [NEUTRAL_REPORT, PRESSED]
+    assert (simulator.stats.overflows, simulator.stats.crc_errors, simulator.stats.packets) == (1, 0, 1)
+
+def test_read_timeout_reset():
+    simulator = FirmwareSimulator()
+    data = frame.encode(PRESSED)
+    simulator.write(0.0, data[:4])
+    # Without the timeout, the partial packet would be prepended to the next one
+    simulator.write(0.001 * (READ_TIMEOUT + 5), data)
+    simulator.flush()
+    assert _reports(simulator) == [NEUTRAL_REPORT, PRESSED]
+    assert (simulator.stats.timeouts, simulator.stats.crc_errors, simulator.stats.packets) == (1, 0, 1)
+
+def test_no_timeout_within_a_packet():
+    simulator = FirmwareSimulator()
+    data = frame.encode(PRESSED)
+    simulator.write(0.0, data[:4])
+    simulator.write(0.001 * (READ_TIMEOUT - 5), data[4:])
+    simulator.flush()
+    assert _reports(simulator) == [NEUTRAL_REPORT, PRESSED]
+    assert simulator.stats.timeouts == 0
+
+def test_simulate():
+    pressed = Gamepad.from_hid_report(PRESSED)
+    neutral = Gamepad.from_hid_report(NEUTRAL_REPORT)
+    simulator = simulate([(pressed, 0.05), (neutral, 0.05)] * 3)
+    assert _reports(simulator) == [NEUTRAL_REPORT] + [PRESSED, NEUTRAL_REPORT] * 3
+    assert simulator.stats.frames_lost == 0
+    # Changes keep the spacing of the segments, rounded to polls
+    times = [time for time, _ in simulator.reports[1:]]
+    assert times[0] <= 2 * 0.008
+    assert all(abs(b - a - 0.05) <= 0.008 for a, b in zip(times, times[1:]))
+
+def test_simulate_shorter_than_poll_interval():
+    pressed = Gamepad.from_hid_report(PRESSED)
+    neutral = Gamepad.from_hid_report(NEUTRAL_REPORT)
+    # Several frames reach the front buffer between two polls and all but the last are lost
+    simulator = simulate([(pressed, 0.002), (neutral, 0.002)] * 10, poll_interval = 0.008)
+    assert simulator.stats.frames_written == 20
+    assert simulator.stats.packets == 20
+    assert simulator.stats.frames_lost > 10
@@ -0,0 +1,56 @@
+import pytest
+
+from codec import varint
+from codec.varint import VarintError
+
+VALUES = [0, 1, 0x7f, 0x80, 300, 0x3fff, 0x4000, 0x1fffff, 0x200000, 2**32, 2**64 - 1]
+
+def test_round_trip():
+    for value in VALUES:
+        data = varint.encode(value)
+        assert len(data) == varint.encoded_size(value)
+        assert varint.decode_with_length(data) == (value, len(data))
+        # At an offset, followed by another value
+        buffer = b"\xff\xff" + data + b"\x05"
+        assert varint.decode_from(buffer, 2) == (value, 2 + len(data))
+        assert varint.decode_from(memoryview(buffer), 2) == (value, 2 + len(data))
+
+def test_sizes_of_fast_paths():
+    assert varint.decode_from(b"\x7f") == (0x7f, 1)
+    assert varint.decode_from(b"\x80\x01") == (0x80, 2)
+    assert varint.decode_from(b"\xff\x7f") == (0x3fff, 2)
+    assert varint.decode_from(b"\x80\x80\x01") == (0x4000, 3)
+
+def test_truncated():
+    for value in VALUES:
+        data = b"\x00" + varint.encode(value)
+        for size in range(1, len(data)):
+            with pytest.raises(VarintError) as info:
+                varint.decode_from(data[:size], 1)
+            assert info.value.offset == 1
+    with pytest.raises(VarintError):
+        varint.decode(b"")
+    with pytest.raises(VarintError):
+        list(varint.iter_decode(varint.encode_many([1, 300]) + b"\x80"))
+
+def test_negative_offset():
+    with pytest.raises(ValueError, match = "Negative offset"):
+        varint.decode_from(b"\x01\x02", -1)
+
+def test_encode_many():
+    data = varint.encode_many(VALUES)
+    assert data == b"".join(varint.encode(value) for value in VALUES)
+    assert list(varint.iter_decode(data)) == VALUES
+    first = len(varint.encode(VALUES[0]))
+    assert list(varint.iter_decode(data, first, len(data) - len(varint.encode(VALUES[-1])))) == VALUES[1:-1]
+
+def test_encode_into():
+    out = bytearray(8)
+    assert varint.encode_into([1, 300], out, 2) == 5
+    assert out == b"\x00\x00\x01\xac\x02\x00\x00\x00"
+    with pytest.raises(ValueError, match = "too small"):
+        varint.encode_into([1, 300], bytearray(2))
+    with pytest.raises(ValueError, match = "too small"):
+        varint.encode_into([300], memoryview(bytearray(3)), 2)
+    with pytest.raises(ValueError, match = "Negative"):
+        varint.encode_into([-1], bytearray(4))
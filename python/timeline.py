@@ -0,0 +1,282 @@
+"""
+Timelines of timed input events, composed by _MacroBuilder without copying any events.
+
+A timeline is a sorted list of events, a list with repeated parts (Repeating), two
+timelines one after the other (Concat) or timelines played at the same time (Overlay).
+Timelines are never modified once built, so they can be shared between builders.
+"""
+from typing import TYPE_CHECKING, TypeAlias, NamedTuple
+from collections.abc import Iterable, Iterator, Generator
+import bisect
+import heapq
+import itertools
+import operator
+
+if TYPE_CHECKING:
+    from macro import InputEvent
+
+class TimedEvent(NamedTuple):
+    time: float
+    event: "InputEvent"
+
+class TimedRepeat(NamedTuple):
+    time: float
+    items: list["TimedItem"]
+    duration: float
+    count: int
+
+TimedItem: TypeAlias = TimedEvent | TimedRepeat
+
+class Repeating(NamedTuple):
+    items: list[TimedItem] # Contains at least one TimedRepeat
+
+class Concat(NamedTuple):
+    left: "Timeline"
+    right: "Timeline"
+    offset: float # Added to the times of right
+    overlaid: bool # Whether an Overlay is nested inside
+
+class Overlay(NamedTuple):
+    timelines: list["Timeline"] # Each sorted by time, merged in order
+
+Timeline: TypeAlias = list[TimedEvent] | Repeating | Concat | Overlay
+
+event_time = operator.itemgetter(0)
+
+def expand(items: Iterable[TimedItem], offset: float = 0) -> Generator[TimedEvent, None, None]:
+    for item in items:
+        if type(item) is TimedEvent:
+            yield TimedEvent(item.time + offset, item.event) if offset else item
+        else:
+            time = item.time + offset
+            for _ in range(item.count):
+                yield from expand(item.items, time)
+                time += item.duration
+
+def concat(left: Timeline, right: Timeline, offset: float) -> Concat:
+    return Concat(left, right, offset, any(
+        type(timeline) is Overlay or (type(timeline) is Concat and timeline.overlaid)
+        for timeline in (left, right)
+    ))
+
+def _concat_pieces(timeline: Timeline) -> Generator[tuple[Timeline, tuple[float, ...]], None, None]:
+    """
+    Flatten nested concatenations into (timeline, offsets) pieces in time order.
+    The offsets are listed from the innermost one, in the order they have to be added.
+    """
+    stack: list[tuple[Timeline, tuple[float, ...]]] = [(timeline, ())]
+    while stack:
+        timeline, offsets = stack.pop()
+        if type(timeline) is Concat:
+            stack.append((timeline.right, (timeline.offset, *offsets)))
+            stack.append((timeline.left, offsets))
+        else:
+            yield timeline, offsets
+
+def _sum_ints(offsets: tuple[float, ...]) -> int | None:
+    """Return the sum of the offsets if they are all integers (ticks), else None."""
+    return sum(offsets) if all(type(offset) is int for offset in offsets) else None
+
+def _shift(timed_events: Iterator[TimedEvent], offsets: tuple[float, ...]) -> Iterator[TimedEvent]:
+    if not offsets:
+        return timed_events
+    if len(offsets) == 1:
+        offset = offsets[0]
+        return (TimedEvent(time + offset, event) for time, event in timed_events)
+    # Float times are shifted by each offset in turn, so that they are exactly those of nested shifts.
+    # Integer times take a single addition.
+    total = _sum_ints(offsets)
+    def shift(time: float) -> float:
+        if total is not None and type(time) is int:
+            return time + total
+        for offset in offsets:
+            time += offset
+        return time
+    return (TimedEvent(shift(time), event) for time, event in timed_events)
+
+def _shift_time(time: float, offsets: tuple[float, ...]) -> float:
+    for offset in offsets:
+        time += offset
+    return time
+
+# Relative margin for skipping repeated parts before a seek time, since the accumulated
+# float times of the repetitions are only approximately known without expanding them
+_SEEK_MARGIN = 1e-9
+
+def _seek_list(timed_events: list[TimedEvent], start: float, offsets: tuple[float, ...]) -> int:
+    """Return the index of the first event at or after start once shifted by offsets."""
+    if not offsets:
+        return bisect.bisect_left(timed_events, start, key = event_time)
+    # Adding offsets is monotonic, so the shifted times are still sorted
+    return bisect.bisect_left(timed_events, start, key = lambda item: _shift_time(item.time, offsets))
+
+def _expand_from(
+    items: list[TimedItem],
+    start: float,
+    offsets: tuple[float, ...],
+    offset: float = 0,
+) -> Generator[TimedEvent, None, None]:
+    """Same as expand() but only the events at or after start once shifted by offsets."""
+    low = start - _SEEK_MARGIN * (abs(start) + 1)
+    index = bisect.bisect_left(items, low, key = lambda item: _shift_time(item.time + offset, offsets))
+    for item in itertools.islice(items, max(index - 1, 0), None):
+        if type(item) is TimedEvent:
+            if _shift_time(item.time + offset, offsets) >= start:
+                yield TimedEvent(item.time + offset, item.event) if offset else item
+        else:
+            time = item.time + offset
+            for _ in range(item.count):
+                if _shift_time(time + item.duration, offsets) >= low:
+                    yield from _expand_from(item.items, start, offsets, time)
+                time += item.duration
+
+def _iter_sequential(
+    timeline: Timeline,
+    start: float | None = None,
+    outer: tuple[float, ...] = (),
+) -> Iterator[TimedEvent]:
+    """
+    Iterate a timeline that contains no Overlay.
+    If start is given, only the events at or after start once shifted by outer are included.
+    """
+    t = type(timeline)
+    if t is list:
+        if start is None:
+            return iter(timeline)
+        return map(timeline.__getitem__, range(_seek_list(timeline, start, outer), len(timeline)))
+    elif t is Repeating:
+        return expand(timeline.items) if start is None else _expand_from(timeline.items, start, outer)
+    else:
+        # The flattened pieces are chained without a generator per nesting level
+        return itertools.chain.from_iterable(
+            _shift(_iter_sequential(piece, start, (*offsets, *outer)), offsets)
+            for piece, offsets in _concat_pieces(timeline)
+        )
+
+class _MergeLevel:
+    """An overlaid timeline under offsets, which iter_timeline() merges on its own."""
+    __slots__ = ("parent", "index", "offsets", "depth", "outer", "count")
+
+    def __init__(self,
+        parent: "_MergeLevel | None",
+        index: int,
+        offsets: tuple[float, ...],
+        outer: tuple[float, ...],
+    ) -> None:
+        self.parent = parent
+        self.index = index # In the parent
+        self.offsets = offsets # From this level to the parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.outer = outer # From this level to the root, then the outer offsets of the iteration
+        self.count = 0 # Number of parts
+
+class _MergeLeaf:
+    """A sequential part of a timeline in the merge of iter_timeline()."""
+    __slots__ = ("events", "level", "index", "to_root", "to_root_sum", "event")
+
+    def __init__(self, events: Iterator[TimedEvent], level: _MergeLevel, index: int, to_root: tuple[float, ...]) -> None:
+        self.events = events # In the time frame of level
+        self.level = level
+        self.index = index # In level
+        self.to_root = to_root
+        self.to_root_sum = _sum_ints(to_root)
+        self.event: TimedEvent | None = None
+
+    def root_time(self) -> float:
+        time = self.event.time
+        if self.to_root_sum is not None and type(time) is int:
+            return time + self.to_root_sum
+        return _shift_time(time, self.to_root)
+
+    def _time_in(self, level: _MergeLevel) -> float:
+        time = self.event.time
+        current = self.level
+        while current is not level:
+            time = _shift_time(time, current.offsets)
+            current = current.parent
+        return time
+
+    def __lt__(self, other: "_MergeLeaf") -> bool:
+        # Only called on a tie at the root. Like merging level by level: by the time in
+        # the innermost level both parts are in, then by their index in it.
+        level, index = self.level, self.index
+        other_level, other_index = other.level, other.index
+        while level.depth > other_level.depth:
+            level, index = level.parent, level.index
+        while other_level.depth > level.depth:
+            other_level, other_index = other_level.parent, other_level.index
+        while level is not other_level:
+            level, index = level.parent, level.index
+            other_level, other_index = other_level.parent, other_level.index
+        if level.depth:
+            time, other_time = self._time_in(level), other._time_in(level)
+            if time != other_time:
+                return time < other_time
+        return index < other_index
+
+def _merge_leaves(leaves: list[_MergeLeaf]) -> Generator[TimedEvent, None, None]:
+    heap: list[tuple[float, _MergeLeaf]] = []
+    for leaf in leaves:
+        leaf.event = next(leaf.events, None)
+        if leaf.event is not None:
+            heap.append((leaf.root_time(), leaf))
+    heapq.heapify(heap)
+    while heap:
+        time, leaf = heap[0]
+        event = leaf.event.event
+        leaf.event = next(leaf.events, None)
+        if leaf.event is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (leaf.root_time(), leaf))
+        yield TimedEvent(time, event)
+
+def iter_timeline(
+    timeline: Timeline,
+    start: float | None = None,
+    outer: tuple[float, ...] = (),
+) -> Iterator[TimedEvent]:
+    """
+    Iterate the events of a timeline sorted by time, in one heap for every nesting level.
+    Events at the same time come out in the same order as nested stable merges would give.
+    If start is given, only the events at or after start once shifted by outer are included.
+    """
+    root = _MergeLevel(None, 0, (), outer)
+    leaves: list[_MergeLeaf] = []
+    lists: list[list[TimedEvent]] = []
+    nested = False
+    stack: list[tuple[Timeline, tuple[float, ...], _MergeLevel]] = [(timeline, (), root)]
+    while stack:
+        timeline, offsets, level = stack.pop()
+        overlaid = type(timeline) is Overlay or (type(timeline) is Concat and timeline.overlaid)
+        if overlaid and not offsets:
+            if type(timeline) is Overlay:
+                stack.extend((child, offsets, level) for child in reversed(timeline.timelines))
+            else:
+                stack.append((timeline.right, (timeline.offset,), level))
+                stack.append((timeline.left, offsets, level))
+            continue
+        index = level.count
+        level.count += 1
+        level_outer = level.outer
+        if overlaid:
+            # Shifting may make distinct times equal, so a shifted overlay is a level of its own
+            nested = True
+            stack.append((timeline, (), _MergeLevel(level, index, offsets, (*offsets, *level_outer))))
+            continue
+        if type(timeline) is list and not offsets:
+            if start is not None:
+                timeline = timeline[_seek_list(timeline, start, level_outer):]
+            lists.append(timeline)
+            events = iter(timeline)
+        else:
+            events = _shift(_iter_sequential(timeline, start, (*offsets, *level_outer)), offsets)
+        leaves.append(_MergeLeaf(events, level, index, level_outer[:len(level_outer) - len(outer)]))
+    if len(leaves) == 1:
+        return _shift(leaves[0].events, leaves[0].to_root)
+    if nested:
+        return _merge_leaves(leaves)
+    if len(lists) == len(leaves):
+        # A stable sort of the concatenated sorted lists gives the same order as merging them
+        return iter(sorted(itertools.chain.from_iterable(lists), key = event_time))
+    return heapq.merge(*(leaf.events for leaf in leaves), key = event_time)